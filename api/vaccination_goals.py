@@ -0,0 +1,160 @@
+"""
+JSON API for the goal projections of the vaccination goals app, served by a standalone stdlib HTTP server next to Streamlit
+
+    python -m api.vaccination_goals [--host 0.0.0.0] [--port 8502]
+
+    GET /locations
+    GET /projections?location=World&location=Europe[&goals=10,50,100][&model=trend][&year=2020]
+
+Responses carry an ETag derived from the data snapshot and the query; clients polling with If-None-Match get a 304 without a body
+"""
+import argparse
+import hashlib
+import json
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from functions import forecasting, projections, vaccinations
+
+YEAR = "2020"
+
+# Fields of a location's summary, besides the per-goal ones
+FIELDS = ["date", "daily_vaccinations", "population", "vacc_start_date", "vaccinated_people"]
+
+# Bounds of the `goals` parameter: every goal is a percentage, and every goal adds three columns to the summaries
+MIN_GOAL, MAX_GOAL = 1, 100
+MAX_GOALS = 20
+
+
+def _value(value):
+    # JSON has no NaN or timestamps
+    if pd.isnull(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return value.item() if hasattr(value, "item") else value
+
+
+@lru_cache(maxsize=2)
+def base(version: str, year: str) -> projections.Projections:
+    """
+    Prepared series of every location, computed once per data snapshot (`version`) and year and shared by all goals and
+    models
+    """
+    return projections.prepare_from_store(year)
+
+
+@lru_cache(maxsize=16)
+def summaries(version: str, year: str, goals: Tuple[int, ...], model: str) -> Dict[str, dict]:
+    """
+    JSON-ready summary of every location, computed once per data snapshot (`version`), year, goals and model
+    """
+    summary = projections.project_goals(base(version, year), goals, model).summary
+
+    columns = FIELDS + [
+        f"{field}_{perc}_perc" for perc in goals for field in ("goal_vaccinations", "days_to_goal", "goal_date")
+    ]
+    return {
+        location: {column: _value(value) for column, value in zip(columns, row)}
+        for location, row in zip(summary.index, summary[columns].itertuples(index=False))
+    }
+
+
+@lru_cache(maxsize=1024)
+def response(version: str, path: str, query: Tuple[Tuple[str, str], ...]) -> Tuple[int, str, bytes]:
+    """
+    Status, ETag and body of a request, cached per data snapshot and normalized query
+    """
+    params = {}
+    for key, value in query:
+        params.setdefault(key, []).extend(part.strip() for part in value.split(",") if part.strip())
+
+    try:
+        year = params.get("year", [YEAR])[0]
+        goals = tuple(sorted({int(goal) for goal in params.get("goals", [])})) or projections.GOALS
+        if len(goals) > MAX_GOALS or not all(MIN_GOAL <= goal <= MAX_GOAL for goal in goals):
+            raise ValueError(f"Expected at most {MAX_GOALS} goals, each between {MIN_GOAL} and {MAX_GOAL}")
+        model = params.get("model", [forecasting.DEFAULT])[0]
+        if model not in forecasting.MODELS:
+            raise ValueError(f"Unknown model {model}, expected one of {', '.join(forecasting.MODELS)}")
+
+        data = summaries(version, year, goals, model)
+
+        if path == "/locations":
+            status, payload = HTTPStatus.OK, {"version": version, "locations": sorted(data)}
+        elif path == "/projections":
+            locations = params.get("location") or sorted(data)
+            unknown = [location for location in locations if location not in data]
+            if unknown:
+                status, payload = HTTPStatus.NOT_FOUND, {"error": f"Unknown location(s) {', '.join(unknown)}"}
+            else:
+                status, payload = HTTPStatus.OK, {
+                    "version": version,
+                    "year": year,
+                    "goals": list(goals),
+                    "model": model,
+                    "locations": {location: data[location] for location in locations},
+                }
+        else:
+            status, payload = HTTPStatus.NOT_FOUND, {"error": "Unknown endpoint, use /locations or /projections"}
+    except (ValueError, KeyError) as e:
+        status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+    body = json.dumps(payload, allow_nan=False).encode()
+    etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+
+    return status, etag, body
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = tuple(sorted((key, value) for key, values in parse_qs(url.query).items() for value in values))
+
+        # Revalidates the snapshot once it is stale, while other requests are served the current one; a new snapshot
+        # changes `version` and so misses the caches
+        vaccinations.store.get()
+        version = vaccinations.store.version
+
+        status, etag, body = response(version, url.path.rstrip("/") or "/", query)
+
+        if status == HTTPStatus.OK and etag in (
+            tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")
+        ):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        # Clients may keep responses but must revalidate them
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    # Precomputes the default projections before the first request
+    vaccinations.store.get()
+    summaries(vaccinations.store.version, YEAR, projections.GOALS, forecasting.DEFAULT)
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Serving on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,18 +8,33 @@ from PIL import Image
 # Sets Streamlit configuration
 st.set_page_config(page_title="Apps", layout="wide", page_icon="01.png")
 
-# Imports apps
-from apps import home, anki_to_obsidian, bubble_pop, free_code_camp, vaccination_goals
+# Apps are imported on first selection, so that only the dependencies of the pages in use are loaded
+from apps import load as load_app
+from functions import instrumentation, warmup
+
+
+def warm_up(executor):
+    # Imports the app on the warm-up thread, so that its heavy dependencies do not hold up the first page load
+    load_app("apps.vaccination_goals", "warm_up")(executor)
+
+
+# Warms up data and charts of the heavier apps in the background, once per server process
+warmup.start(warm_up)
 
 apps = {
-    "Home": home.app,  # Home
-    "Anki to Obsidian exporter": anki_to_obsidian.app,
-    "Bubble Pop!": bubble_pop.app,
-    # "freeCodeCamp Projects": free_code_camp.app,
-    "Vaccination Goal Visualizer": vaccination_goals.app,
+    "Home": "apps.home",  # Home
+    "Anki to Obsidian exporter": "apps.anki_to_obsidian",
+    "Bubble Pop!": "apps.bubble_pop",
+    # "freeCodeCamp Projects": "apps.free_code_camp",
+    "Vaccination Goal Visualizer": "apps.vaccination_goals",
 }
 app_titles = list(apps.keys())
 
+# Reachable only by their query parameter, e.g. ?app=Diagnostics
+hidden_apps = {
+    "Diagnostics": "apps.diagnostics",
+}
+
 
 def main():
     """
@@ -40,6 +55,10 @@ def main():
         query_params = st.experimental_get_query_params()
         app_title = query_params["app"][0] if "app" in query_params else app_titles[0]
 
+        if app_title in hidden_apps:
+            load_app(hidden_apps[app_title])()
+            return
+
         # st.sidebar.selectbox() requires default 'index'
         try:
             index = app_titles.index(app_title)
@@ -48,7 +67,8 @@ def main():
         selected_app = st.sidebar.selectbox("Select a project", app_titles, index)
 
         # Runs selected app
-        apps[selected_app]()
+        with instrumentation.stage(selected_app, kind="app"):
+            load_app(apps[selected_app])()
 
         # st.experimental_set_query_params() # app=selected_app
     else:
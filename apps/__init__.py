@@ -0,0 +1,11 @@
+import importlib
+from functools import lru_cache
+from typing import Callable
+
+
+@lru_cache(maxsize=None)
+def load(module: str, name: str = "app") -> Callable:
+    """
+    Imports the app `module` on first use and returns its `name` attribute (the app entry point by default); the handle is kept for the life of the server process, as Streamlit re-executes the main script on every rerun
+    """
+    return getattr(importlib.import_module(module), name)
@@ -3,10 +3,99 @@ import streamlit.components.v1 as components
 
 # Application requirements
 import io
-from io import StringIO
-import re
-import base64
+import os
+import tempfile
 import time
+import zipfile
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple
+
+import humanize
+
+from constants import CACHE_DIR
+from functions import anki, instrumentation
+
+# Records shown in the before and after previews
+PREVIEW = 5
+
+
+# Converted files are written here, named by upload digest and card format, and removed after `OUTPUT_TTL` seconds
+OUTPUT_DIR = CACHE_DIR / "anki"
+OUTPUT_TTL = 60 * 60
+
+
+class Conversion(NamedTuple):
+    path: Path
+    cards: int
+    file_name: str
+    mime: str
+
+
+def _remove_old_outputs() -> None:
+    # Twice the cache TTL, so that no cached entry outlives its file
+    for path in OUTPUT_DIR.glob("*"):
+        try:
+            if time.time() - path.stat().st_mtime > 2 * OUTPUT_TTL:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# Kept per upload and card format, so that reruns (e.g. the one of the download button) do not convert again
+# Uploads are keyed by their digest instead of hashing their contents on every rerun; only the path of the output is cached
+@st.cache(
+    show_spinner=False,
+    suppress_st_warning=True,
+    max_entries=16,
+    ttl=OUTPUT_TTL,
+    hash_funcs={anki.Upload: lambda upload: upload.digest},
+)
+@instrumentation.timed("convert")
+def get_conversion(upload: anki.Upload, option: str) -> Conversion:
+    progress_bar = st.progress(0)
+    status = st.empty()
+
+    def on_progress(progress: anki.Progress) -> None:
+        progress_bar.progress(progress.bytes_read / max(progress.bytes_total, 1))
+        status.text(
+            f"{progress.cards:,} cards, {humanize.naturalsize(progress.bytes_read)} of {humanize.naturalsize(progress.bytes_total)} ({humanize.naturalsize(progress.throughput)}/s)"
+        )
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    _remove_old_outputs()
+
+    # Plain exports are read in place; only zip members are held in memory
+    exports = list(anki.read_exports(upload.files))
+    if len(exports) == 1:
+        name, file = exports[0]
+        file_name, mime = f"{name}.md", "text/markdown"
+    else:
+        file_name, mime = f"anki-{option.lower()}.zip", "application/zip"
+    path = OUTPUT_DIR / f"{upload.digest}-{option.lower()}{Path(file_name).suffix}"
+
+    # Streams the conversion to a temporary file, swapped in once complete; other workers may write the same output
+    with tempfile.NamedTemporaryFile("wb", dir=OUTPUT_DIR, delete=False) as output:
+        try:
+            if len(exports) == 1:
+                text = io.TextIOWrapper(output, encoding="utf-8")
+                cards = anki.convert_file(file, option, text, on_progress).cards
+                text.detach()
+            else:
+                # Decks are converted in parallel and bundled into one archive
+                cards = sum(
+                    anki.convert_batch(
+                        exports, option, output, on_progress=on_progress
+                    ).values()
+                )
+        except BaseException:
+            output.close()
+            os.remove(output.name)
+            raise
+    os.replace(output.name, path)
+
+    return Conversion(path, cards, file_name, mime)
+
 
 # Defines the application
 def app():
@@ -18,7 +107,7 @@ def app():
 
     with col1:
         options = st.expander("Options", False)
-        option = options.radio("Select your Anki card format", ["Basic"])
+        option = options.radio("Select your Anki card format", list(anki.FORMATTERS))
 
     # with col3:
     #     # fmt: off
@@ -30,12 +119,11 @@ def app():
     #     )
     #     # fmt: on
 
-
     with col2:
-        uploaded_file = st.file_uploader(
-            "Choose your export file",
-            type="txt",
-            accept_multiple_files=False,
+        uploaded_files = st.file_uploader(
+            "Choose your export files or a zip archive of them",
+            type=["txt", "zip"],
+            accept_multiple_files=True,
             key=None,
             help=None,
         )
@@ -44,49 +132,67 @@ def app():
 
     col3, col4 = st.columns((1, 1))
 
-    if uploaded_file is not None:
+    if uploaded_files:
+        upload = anki.read_upload(uploaded_files)
+        try:
+            # Only the first export is expanded for the preview
+            first = next(anki.read_exports(upload.files), None)
+        except (ValueError, zipfile.BadZipFile) as e:
+            st.error(e)
+            st.stop()
+        if first is None:
+            st.error("No .txt export files were found in the upload")
+            st.stop()
+
+        name, data = first
+
         with col3:
             with st.spinner(text="Loading preview..."):
-                stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-                string_data = stringio.read()
-                stringio.close()
-
                 st.header("Before preview")
-                st.write(string_data.split("\n")[:5])
-
-            if re.search(r"^(.*)\t(.*)\t(.*)", string_data) == None:
-                st.error("Please check if you exported the file per instructions")
-                st.stop()
-
-            out = re.sub(
-                r"^(.*)\t(.*)\t(.*)",
-                rf"START\n{option}\n\1\nBack: \2\nTags: \3\nEND\n\n",
-                string_data,
-                flags=re.MULTILINE,
-            )
-
-            st.success("Conversion success")
+                # Decks from several files or an archive
+                if len(upload.files) > 1 or data is not upload.files[0]:
+                    st.caption(name)
+                st.write(
+                    [
+                        line.rstrip("\r\n")
+                        for line in islice(anki.read_lines(data), PREVIEW)
+                    ]
+                )
 
         with col4:
             with st.spinner(text="Preparing download..."):
-                time.sleep(4)
-
-                output = StringIO()
-                output.write(out)
-
-                o = output.getvalue()
-
-                b64 = base64.b64encode(
-                    o.encode()
-                ).decode()  # some strings <-> bytes conversions necessary here
-                href = f'<a href="data:file/txt;base64,{b64}" download="anki-{option.lower()}.md">Download Markdown</a>'
-
-                st.markdown(href, unsafe_allow_html=True)
-
-                output.close()
+                try:
+                    conversion = get_conversion(upload, option)
+                except (ValueError, zipfile.BadZipFile) as e:
+                    st.error(e)
+                    st.stop()
+
+                if conversion.cards == 0:
+                    with col3:
+                        st.error(
+                            "Please check if you exported the file per instructions"
+                        )
+                    st.stop()
+
+                with col3:
+                    st.success("Conversion success")
+
+                with open(conversion.path, "rb") as f:
+                    st.download_button(
+                        "Download Markdown",
+                        data=f,
+                        file_name=conversion.file_name,
+                        mime=conversion.mime,
+                    )
 
             with st.spinner(text="Loading preview..."):
-                time.sleep(4)
-
                 st.header("After preview")
-                st.write(out.split("\n\n")[:5])
\ No newline at end of file
+                st.write(
+                    [
+                        record.rstrip("\n")
+                        for record, is_card in islice(
+                            anki.convert(anki.read_lines(data), option),
+                            PREVIEW,
+                        )
+                    ]
+                )
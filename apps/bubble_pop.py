@@ -2,7 +2,6 @@ import streamlit as st
 import streamlit.components.v1 as components
 # import pathlib
 # import os
-from streamlit import caching
 
 # caching.clear_cache()
 
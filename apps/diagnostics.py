@@ -0,0 +1,25 @@
+import streamlit as st
+
+from functions import instrumentation
+
+
+# Hidden page, reached with ?app=Diagnostics
+def app():
+    st.title("Diagnostics")
+
+    if not instrumentation.ENABLED:
+        st.info(
+            "Instrumentation is disabled. Set the `INSTRUMENTATION` environment variable to `1`, or to `memory` to also trace allocations, and restart the server."
+        )
+        st.stop()
+
+    st.markdown(
+        f"Rolling percentiles over the last {instrumentation.WINDOW} samples of every app and stage of this server process."
+    )
+    st.dataframe(instrumentation.summary())
+
+    metrics = instrumentation.prometheus()
+    st.download_button(
+        "Download metrics", metrics, file_name="metrics.txt", mime="text/plain"
+    )
+    st.code(metrics, language=None)
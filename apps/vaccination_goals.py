@@ -1,451 +1,347 @@
 import streamlit as st
 import streamlit.components.v1 as components
 
-import copy
-
-import base64
-from io import StringIO
-
 import json
 
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+
+from functions import (
+    charts,
+    exports,
+    forecasting,
+    instrumentation,
+    population,
+    projections,
+    regions,
+    vaccinations,
+)
+from functions.figure_cache import FigureCache
+
 VERSION = 4.2
 
-# Defines the application
-def app():
-    import humanize
-    import pandas as pd
-    import numpy as np
-    from datetime import date
-    from datetime import datetime
-    from datetime import timedelta
-    import plotly.express as px
-    import plotly.graph_objects as go
+DEMOGRAPHIC_DATA = "https://population.un.org/wpp/Download/Files/1_Indicators%20(Standard)/EXCEL_FILES/1_Population/WPP2019_POP_F01_1_TOTAL_POPULATION_BOTH_SEXES.xlsx"
+
+YEAR = "2020"
+
+# Points per trace in lightweight charts
+MAX_POINTS = 300
+
+# Rows per page of the dataset table
+PAGE_ROWS = 100
+
+# Pre-rendered by `warm_up` at server boot
+POPULAR_LOCATIONS = [
+    "World",
+    "Africa",
+    "Asia",
+    "Europe",
+    "North America",
+    "South America",
+    "Oceania",
+    "High income",
+    "Upper middle income",
+    "Lower middle income",
+    "Low income",
+]
+
+
+# Local snapshot of the OWID feed, revalidated with a conditional GET once it is stale
+@instrumentation.timed("fetch")
+def get_vaccination_data() -> pd.DataFrame:
+    return vaccinations.store.get()
+
+
+# Stages under `st.cache` are recorded on cache misses only
+# Reads a single year of the columnar UN population store, indexed by UN code
+@st.cache(show_spinner=False, suppress_st_warning=True)
+@instrumentation.timed()
+def read_population_data(year: str) -> pd.Series:
+    try:
+        return population.read_column(population.UN_POPULATION, year)
+    except FileNotFoundError:
+        try:
+            population.build_columnar(
+                population.POPULATION_DATA
+                if population.POPULATION_DATA.exists()
+                else DEMOGRAPHIC_DATA
+            )
+        except ValueError:
+            st.warning("This app is currently unavailable due to a maintenance")
+            st.stop()
 
-    import pycountry
+    return population.read_column(population.UN_POPULATION, year)
 
-    st.title(f"Vaccination Goal Visualizer, v{VERSION}")
-    st.markdown(
-        """
-        This app approximates a date when our global vaccination goals will be achieved given the current rate of vaccination; data are updated every day and automatically reflected in charts.
-        * **Data sources:** [Our World In Data](https://ourworldindata.org/covid-vaccinations), [United Nations](https://population.un.org/wpp)
-        * **Disclaimer:** *work in progress; vaccination data in certain regions is reported inconsistently; plot figures are estimated and can not be fully accurate*
-        * Another excellent project using the same data from OWID: [Covidvax.live](https://covidvax.live/)
-    """
-    )
 
-    demographic_data = "https://population.un.org/wpp/Download/Files/1_Indicators%20(Standard)/EXCEL_FILES/1_Population/WPP2019_POP_F01_1_TOTAL_POPULATION_BOTH_SEXES.xlsx"
-    vaccination_data = "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/vaccinations/vaccinations.csv"
+# Selects population of every location from the prebuilt location -> UN code mapping
+# Run `python -m functions.population codes` to rebuild it when OWID adds locations
+@st.cache(show_spinner=False)
+@instrumentation.timed()
+def get_populations(year: str) -> pd.Series:
+    return population.get_populations(
+        read_population_data(year), population.read_location_codes()
+    )
 
-    year = "2020"
 
-    @st.cache(show_spinner=False)
-    def get_vaccination_data() -> pd.DataFrame:
-        df = pd.read_csv(
-            vaccination_data,
-            usecols=["date", "location", "daily_vaccinations"],
-            parse_dates=["date"],
+# Yearly populations from Gapminder, indexed by OWID location name; give the share of fully vaccinated people of every day
+@st.cache(show_spinner=False)
+@instrumentation.timed()
+def get_population_table() -> pd.DataFrame:
+    try:
+        return population.get_population_table()
+    except FileNotFoundError:
+        population.write_columnar(
+            population.TOTAL_POPULATION, population.read_population_total_data()
         )
-        return df
 
-    @st.cache(show_spinner=False, suppress_st_warning=True)
-    def read_population_data():
-        import pickle
+    return population.get_population_table()
 
-        try:
-            with open("apps/data/population_data.pickle", "rb") as f:
-                df = pickle.load(f)
-        except FileNotFoundError:
-            try:
-                df = pd.read_excel(demographic_data)
-                with open("apps/data/population_data.pickle", "wb") as f:
-                    pickle.dump(df, f)
-            except ValueError:
-                st.warning("This app is currently unavailable due to a maintenance")
-                st.stop()
 
-        # Removes first 14 rows containing unrelated information
-        df = df.iloc[15:]
-
-        # Sets the first row as column names
-        df.columns = df.iloc[0]
-
-        # Removes the first row containing column names as it is no longer needed
-        df = df.iloc[1:]
-
-        return df
-
-    location_codes = {
-        "World": 900,
-        "Asia": 935,
-        "Cape Verde": 132,
-        "Europe": 908,
-        "High income": 1503,
-        "Low income": 1500,
-        "Upper middle income": 1502,
-        "South Korea": 410,
-        "South America": 931,
-        "Oceania": 909,
-        "North America": 905,
-    }
-
-    # TODO: needs a better algorithm
-    # Commented out values have been fixed
-    problematic_locations = [
-        "Bonaire Sint Eustatius and Saba",
-        "Burkina Faso",
-        "Cook Islands",
-        "Democratic Republic of Congo",
-        "European Union",
-        "Faeroe Islands",
-        "Guernsey",
-        "Uganda",
-        "Turkmenistan",
-        "Tanzania",
-        "Sudan",
-        "South Sudan",
-        "Sao Tome and Principe",
-        "Pitcairn",
-        "Northern Cyprus",
-        "Nigeria",
-        "Niger",
-    ]
-    # "Falkland Islands"
-    # "Bhutan"
-
-    # Selects country population
-    # @st.cache(show_spinner=False)
-    def get_population(country: str, year: str) -> dict:
-        population = {}
-
-        df1 = read_population_data()
+@st.cache(show_spinner=False, allow_output_mutation=True, max_entries=2)
+@instrumentation.timed("prepare")
+def get_base_projections(version: str, year: str) -> projections.Projections:
+    # Output is shared between reruns and sessions; treat as read-only
+    # `version` identifies the data snapshot, so new data invalidates the entry
+    return projections.prepare(
+        get_vaccination_data(), get_populations(year), get_population_table()
+    )
 
-        try:
-            if country in list(location_codes.keys()):
-                code = location_codes[country]
-            else:
-                code_obj = pycountry.countries.search_fuzzy(country)[0]
-                code = int(code_obj.numeric)
-                # population["population"] = df1.loc[ df1[df1.columns[2]] == country.toupper(), year ].values[0] * 1000
-                # population["population"] = df1.loc[ df1[df1.columns[2]].str.contains(country.toupper()), year ].values[0] * 1000
-            population["population"] = (
-                df1.loc[df1[df1.columns[4]] == code, year].values[0] * 1000
-            )
-        # except (LookupError, OutOfBoundsDatetime) as e:
-        except Exception as e:
-            # print(e)
-            st.error(
-                f"Something went wrong when looking up data for {country}. Please select a different location. I am working on a solution."
-            )
-            st.stop()
 
-        return population
+# `custom_regions` holds (name, members) pairs of user-defined regions; only their own rows are aggregated and prepared,
+# in a cache of their own, so that user-defined regions never evict the shared projections of all locations
+@st.cache(show_spinner=False, allow_output_mutation=True, max_entries=16)
+@instrumentation.timed("prepare_regions")
+def get_region_base_projections(
+    version: str, year: str, custom_regions: tuple
+) -> projections.Projections:
+    definitions = dict(custom_regions)
+    return projections.prepare(
+        regions.aggregate(get_vaccination_data(), definitions),
+        regions.populations(get_populations(year), definitions),
+        regions.population_table(get_population_table(), definitions),
+    )
+
+
+# Goal projections are cheap next to `get_base_projections`, so switching goals or models only reruns this step
+@st.cache(show_spinner=False, allow_output_mutation=True, max_entries=8)
+@instrumentation.timed("projections")
+def get_projections(
+    version: str, year: str, goals: tuple, model: str
+) -> projections.Projections:
+    return projections.project_goals(get_base_projections(version, year), goals, model)
+
+
+@st.cache(show_spinner=False, allow_output_mutation=True, max_entries=16)
+@instrumentation.timed("projections")
+def get_region_projections(
+    version: str, year: str, goals: tuple, model: str, custom_regions: tuple
+) -> projections.Projections:
+    return projections.project_goals(
+        get_region_base_projections(version, year, custom_regions), goals, model
+    )
 
-    ##############################
-    # Functions
-    ##############################
-    @st.cache(show_spinner=False, allow_output_mutation=True)
-    def make_plot(df1, location_info1, location, year):
-        df = copy.deepcopy(df1)
-        location_info = copy.deepcopy(location_info1)
-
-        df = df.astype({"percent_fully_vaccinated": int})
-
-        def set_predict_or_fact(perc: int) -> None:
-            def closest(lst, K):
-                return lst[min(range(len(lst)), key=lambda i: abs(lst[i] - K))]
-
-            percent_fully_vaccinated_list = df["percent_fully_vaccinated"].tolist()
-
-            perc_approx = closest(percent_fully_vaccinated_list, perc)
-
-            if (
-                perc - perc_approx > np.diff(percent_fully_vaccinated_list).max()
-                or perc_approx - perc < -np.diff(percent_fully_vaccinated_list).max()
-            ):
-                perc_approx = perc
-
-            try:  #
-                location_info[location][f"date_vacc_{perc}_perc"] = df.loc[
-                    df["percent_fully_vaccinated"] == perc_approx, "date"
-                ][-1]
-                location_info[location][
-                    f"daily_vaccinations_cumsum_{perc}_perc"
-                ] = df.loc[
-                    df["percent_fully_vaccinated"] == perc_approx,
-                    "daily_vaccinations_cumsum",
-                ][
-                    -1
-                ]
-            except IndexError:
-                location_info[location][f"date_vacc_{perc}_perc"] = location_info[
-                    location
-                ][f"goal_date_{perc}_perc"]
-                location_info[location][
-                    f"daily_vaccinations_cumsum_{perc}_perc"
-                ] = location_info[location][f"goal_vaccinations_{perc}_perc"]
-            return None
-
-        set_predict_or_fact(10)
-        set_predict_or_fact(30)
-        set_predict_or_fact(50)
-        set_predict_or_fact(70)
-        set_predict_or_fact(80)
-        set_predict_or_fact(100)
-
-        # ---------------------------------------------------------------------------------------------------------
-
-        fig = go.Figure()
-
-        fig.add_trace(
-            go.Line(
-                x=df["date"],
-                y=df["daily_vaccinations_cumsum"],
-                name="total",
-                hoverinfo="y",
-                hovertemplate="%{y:,}",
-                yaxis="y1",
-                fill="tozeroy",
-                marker_color="rgba(115, 65, 225, 0.5)",
-                marker_line_width=0,
-            )
-        )
 
-        fig.add_trace(
-            go.Line(
-                x=df["date"],
-                y=df["daily_vaccinations"],
-                name="daily",
-                hoverinfo="skip",
-                hovertemplate=None,
-                yaxis="y2",
-                marker_color="#ffffff",
-                marker_line_width=0,
-                line=dict(color="#ffffff", width=6),
+# Exports are built on request and kept per location and data snapshot
+@st.cache(show_spinner=False, allow_output_mutation=True, max_entries=32)
+@instrumentation.timed("export")
+def get_export(
+    version: str, year: str, custom_regions: tuple, location: str, fmt: str
+) -> bytes:
+    # The series of a location do not depend on goals or the forecasting model
+    # `custom_regions` are the regions of the page, so that a region reuses the base projections the page prepared; they
+    # are part of the key, as region names are not unique between users
+    base = (
+        get_region_base_projections(version, year, custom_regions)
+        if location in dict(custom_regions)
+        else get_base_projections(version, year)
+    )
+    data = projections.select(base, location)
+    return exports.to_bytes(data.to_frame(), fmt)
+
+
+def export_regions(location: str, custom_regions: tuple) -> tuple:
+    # Exports of other locations do not depend on the regions, so editing them does not miss their cache entries
+    return custom_regions if location in dict(custom_regions) else ()
+
+
+@st.cache(show_spinner=False, allow_output_mutation=True, max_entries=4)
+def get_export_bundle(
+    version: str, year: str, custom_regions: tuple, locations: tuple, fmt: str
+) -> bytes:
+    extension = exports.FORMATS[fmt].extension
+    return exports.bundle(
+        {
+            f"Vaccination Info - {location}{extension}": get_export(
+                version, year, export_regions(location, custom_regions), location, fmt
             )
+            for location in locations
+        }
+    )
+
+
+def download_button(
+    locations: list, year: str, custom_regions: tuple, label: str, key: str
+) -> None:
+    """
+    Offers the dataset of `locations` for download in a format of `exports.FORMATS`; several locations are bundled into one zip archive
+    """
+    col1, col2 = st.columns((1, 1))
+    with col1:
+        fmt = st.selectbox(
+            "Format",
+            list(exports.FORMATS),
+            format_func=lambda fmt: exports.FORMATS[fmt].label,
+            key=f"{key}_format",
         )
-        fig.add_trace(
-            go.Line(
-                x=df["date"],
-                y=df["daily_vaccinations"],
-                name="daily",
-                hoverinfo="y",
-                hovertemplate="%{y:,}",
-                yaxis="y2",
-                marker_color="Red",
-                marker_line_width=0,
-                line=dict(color="Red", width=2),
-            )
+    export_format = exports.FORMATS[fmt]
+
+    if len(locations) == 1:
+        data = get_export(
+            vaccinations.store.version,
+            year,
+            export_regions(locations[0], custom_regions),
+            locations[0],
+            fmt,
         )
-
-        fig.update_layout(
-            xaxis=dict(
-                title="<b>Days</b>",
-                showgrid=False,
-                # layer="above traces",
-            ),
-            yaxis=dict(
-                title="<b>Total vaccinations,</b> shots (cumulative daily sum)",
-                # titlefont=dict(
-                #     color="#1f77b4"
-                # ),
-                # tickfont=dict(
-                #     color="#1f77b4"
-                # ),
-                showgrid=False,
-                anchor="x",
-                rangemode="tozero",
-            ),
-            yaxis2=dict(
-                title="<b>Daily vaccinations,</b> shots",
-                # titlefont=dict(
-                #     color="#1f77b4"
-                # ),
-                # tickfont=dict(
-                #     color="#1f77b4"
-                # ),
-                anchor="x",
-                overlaying="y1",
-                side="right",
-                showgrid=False,
-                rangemode="nonnegative",
-                scaleanchor="y1",
-                scaleratio=50,
-            ),
+        file_name = f"Vaccination Info - {locations[0]}{export_format.extension}"
+        mime = export_format.mime
+    else:
+        data = get_export_bundle(
+            vaccinations.store.version, year, custom_regions, tuple(locations), fmt
         )
+        file_name = "Vaccination Info.zip"
+        mime = "application/zip"
 
-        # ---------------------------------------------------------------------------------------------------------------------------
-
-        _population = int(location_info[location]["population"])
-        _vacc_start_date = location_info[location]["vacc_start_date"]
-        _date = location_info[location]["date"]
-        _vaccinated_people = int(location_info[location]["vaccinated_people"])
-        _daily_vaccinations = location_info[location]["daily_vaccinations"]
-
-        fig.add_annotation(
-            text=f"<b>Population:</b> {humanize.intword(_population)} ({year})<br><b>Vaccination started:</b> {_vacc_start_date:%B %d, %Y}<br><b>{_date:%B %d, %Y}:</b> {_vaccinated_people:,} ({int(_vaccinated_people*100/int(_population))}%) people<br>have received at least 2 doses of vaccine,<br>{int(_daily_vaccinations):,} shots were administered",
-            align="left",
-            x=0.05,
-            y=0.95,
-            xref="paper",
-            yref="paper",
-            # hovertext=f"",
-            showarrow=False,
-            # xanchor="right",
-            # xshift=-10,
-            bgcolor="rgba(245, 247, 243, 0.85)",
-        )
+    with col2:
+        st.download_button(label, data, file_name=file_name, mime=mime, key=key)
 
-        # ---------------------------------------------------------------------------------------------------------------------------
-
-        def add_goal_marker(
-            perc: int, xanchor: str, xshift: int, text: str = None
-        ) -> None:
-            xanchor = xanchor
-            xshift = xshift
-            if int(location_info[location][f"days_to_goal_{perc}_perc"]) <= 0:
-                text = f"<b>{perc}%</b>"
-                font_color = "Green"
-                color = "Green"
-                xanchor = "right"
-                xshift = 5
-            else:
-                text = text or f"<b>{perc}%</b>"
-                font_color = "Orange"
-                color = "Orange"
-            fig.add_annotation(
-                text=text,
-                align="center",
-                x=location_info[location][f"date_vacc_{perc}_perc"],
-                y=location_info[location][f"daily_vaccinations_cumsum_{perc}_perc"],
-                font_color=font_color,
-                # arrowcolor="Red",
-                # arrowhead=1,
-                # hovertext=f"",
-                showarrow=False,
-                yanchor="bottom",
-                xanchor=xanchor,
-                xshift=xshift,
-                bgcolor="rgba(255,255,255,0.85)",
-            )
-            fig.add_shape(
-                type="line",
-                x0=location_info[location][f"date_vacc_{perc}_perc"],
-                y0=0,
-                x1=location_info[location][f"date_vacc_{perc}_perc"],
-                y1=location_info[location][f"daily_vaccinations_cumsum_{perc}_perc"],
-                line=dict(
-                    color="White",
-                    width=2,
-                    # dash="dot"
-                ),
-            )
-            fig.add_shape(
-                type="line",
-                x0=location_info[location][f"date_vacc_{perc}_perc"],
-                y0=0,
-                x1=location_info[location][f"date_vacc_{perc}_perc"],
-                y1=location_info[location][f"daily_vaccinations_cumsum_{perc}_perc"],
-                line=dict(color=color, width=2, dash="dot"),
-            )
-            return None
-
-        # humanize.naturalday(dt.datetime.now() - dt.timedelta(days=1))
-
-        def get_annotation_for_goal_marker(perc: int) -> str:
-            return "<b>-- {_perc}% --</b><br>in <b>{_days_to_goal} day(s)</b><br><b>({_goal_date:%B %Y})</b><br>~ {_goal_vaccinations} doses".format(
-                _perc=perc,
-                _days_to_goal=int(location_info[location][f"days_to_goal_{perc}_perc"]),
-                _goal_date=location_info[location][f"goal_date_{perc}_perc"],
-                _goal_vaccinations=humanize.intword(
-                    int(location_info[location][f"goal_vaccinations_{perc}_perc"])
-                ),
-            )
 
-        add_goal_marker(10, "right", 5)
-        add_goal_marker(30, "right", 5)
-        add_goal_marker(50, "right", 5)
-        add_goal_marker(70, "right", 5)  # , get_annotation_for_goal_marker(70)
-        add_goal_marker(80, "left", -5, get_annotation_for_goal_marker(80))
-        add_goal_marker(100, "left", -5, get_annotation_for_goal_marker(100))
-
-        fig.update_layout(
-            {"plot_bgcolor": "#f5f7f3", "paper_bgcolor": "#f5f7f3"},
-            hovermode="x",
-            hoverlabel=dict(font_color="white"),
-            title_text=f"{location}",
-            width=800,
-            showlegend=False,
+def render_dataset(df: pd.DataFrame, key: str, page_rows: int = PAGE_ROWS) -> None:
+    """
+    Shows `df` a page at a time, with duplicate values of `daily_vaccinations` highlighted; the duplicates are found once over the whole frame with a hash lookup, and only the page shown is styled
+    """
+    duplicates = df["daily_vaccinations"].duplicated(keep=False).to_numpy()
+
+    pages = max(-(-len(df) // page_rows), 1)
+    page = (
+        st.number_input(
+            f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=key
         )
+        if pages > 1
+        else 1
+    )
+    rows = slice((page - 1) * page_rows, page * page_rows)
 
-        # fig.update_xaxes(ticklabelmode="period")
+    st.dataframe(
+        df.iloc[rows].style.apply(
+            lambda column: np.where(duplicates[rows], "background: yellow", ""),
+            subset="daily_vaccinations",
+        )
+    )
+    st.caption(f"Rows {rows.start + 1}-{min(rows.stop, len(df))} of {len(df)}")
 
-        return fig
 
-    # ---------------------------------------------------------------------------------------------------------------------------
-    # @st.cache(show_spinner=False, suppress_st_warning=True)
-    # allow_output_mutation=True
-    def process_vaccination_data(df_vaccination_data_raw, location):
+# ---------------------------------------------------------------------------------------------------------------------------
+@instrumentation.timed("select")
+def process_vaccination_data(
+    projections_, location, region_projections=None
+) -> projections.LocationData:
+    # User-defined regions are projected apart from the shared projections of all locations
+    if region_projections is not None and location in region_projections.rows:
+        projections_ = region_projections
+    return projections.select(projections_, location)
 
-        df = df_vaccination_data_raw[df_vaccination_data_raw["location"] == location]
 
-        df["daily_vaccinations_cumsum"] = df["daily_vaccinations"].transform("cumsum")
+# Serialized figures shared by every worker process on the host
+figure_cache = FigureCache()
 
-        df.set_index("location", inplace=True, drop=True)
 
-        location_info_series = df.iloc[-1]
+@instrumentation.timed("figure")
+def get_figure(
+    data: projections.LocationData, year, max_points=None, members: tuple = ()
+) -> go.Figure:
+    """
+    Returns the chart of `data` from the figure cache, keyed by data snapshot, or makes and caches it; `members` of a user-defined region are part of the key, as region names are not unique between users
+    """
+    goals = [goal.perc for goal in data.goals]
+    key = figure_cache.make_key(
+        data.location,
+        members,
+        year,
+        vaccinations.store.version,
+        goals,
+        data.model,
+        max_points,
+        charts.VERSION,
+    )
 
-        if location in problematic_locations:
-            st.error(
-                f"Sorry, cannot make a chart for {location}. Here is the raw data instead."
-            )
-            st.dataframe(df)
-            st.stop()
+    return _cached_figure(key, charts.make_plot, data, year, max_points)
+
+
+@instrumentation.timed("figure")
+def get_combined_figure(
+    datas: list, year, max_points=None, custom_regions: tuple = ()
+) -> go.Figure:
+    goals = sorted({goal.perc for data in datas for goal in data.goals})
+    key = figure_cache.make_key(
+        [data.location for data in datas],
+        custom_regions,
+        year,
+        vaccinations.store.version,
+        goals,
+        max_points,
+        charts.VERSION,
+    )
 
-        # ---------------------------------------------------------------------------------------------------------------------------
+    return _cached_figure(key, charts.make_combined_plot, datas, year, max_points)
 
-        location_info = {location_info_series.name: dict(location_info_series)}
 
-        # ---------------------------------------------------------------------------------------------------------------------------
+def _cached_figure(key, make, *args) -> go.Figure:
+    figure_json = figure_cache.get(key)
+    if figure_json is not None:
+        # The cached JSON was made from a valid figure: wrapped without validating it again, as `st.plotly_chart` would
+        # run a plain dict through full validation
+        return go.Figure(json.loads(figure_json), _validate=False)
 
-        location_info[location].update(**get_population(location, year))
+    fig = make(*args)
+    figure_cache.put(key, fig.to_json())
 
-        location_info[location]["vacc_start_date"] = df.iloc[0, 0]
+    return fig
 
-        location_info[location]["vaccinated_people"] = (
-            location_info[location]["daily_vaccinations_cumsum"] / 2
-        )
 
-        df["percent_fully_vaccinated"] = df["daily_vaccinations_cumsum"].apply(
-            lambda x: (x * 100) / (location_info[location]["population"] * 2)
-        )
+def warm_up(executor) -> None:
+    """
+    Fetches and parses the data, builds the population index and renders the charts of `POPULAR_LOCATIONS` with the default goals on `executor`, so that the first visitors hit the cache
+    """
+    get_vaccination_data()
+    projections_ = get_projections(
+        vaccinations.store.version, YEAR, projections.GOALS, forecasting.DEFAULT
+    )
 
-        def set_predict_goal_date(perc: int) -> None:
-            location_info[location][f"goal_vaccinations_{perc}_perc"] = (
-                location_info[location]["population"] * perc / 100
-            ) * 2
-            location_info[location][f"days_to_goal_{perc}_perc"] = int(
-                (
-                    (location_info[location]["population"] * perc / 100)
-                    - location_info[location]["vaccinated_people"]
-                )
-                / location_info[location]["daily_vaccinations"]
-                * 2
-            )
-            location_info[location][f"goal_date_{perc}_perc"] = location_info[location][
-                "date"
-            ] + timedelta(days=location_info[location][f"days_to_goal_{perc}_perc"])
-            return None
+    def render(location: str) -> None:
+        data = process_vaccination_data(projections_, location)
+        if not np.isnan(data.population):
+            get_figure(data, YEAR)
 
-        set_predict_goal_date(10)
-        set_predict_goal_date(100)
-        set_predict_goal_date(80)
-        set_predict_goal_date(70)
-        set_predict_goal_date(50)
-        set_predict_goal_date(30)
+    for location in POPULAR_LOCATIONS:
+        if location in projections_.summary.index:
+            executor.submit(render, location)
 
-        df["percent_fully_vaccinated"].fillna(0, inplace=True)
 
-        return df, location_info
+# Defines the application
+def app():
+    st.title(f"Vaccination Goal Visualizer, v{VERSION}")
+    st.markdown(
+        """
+        This app approximates a date when our global vaccination goals will be achieved given the current rate of vaccination; data are updated every day and automatically reflected in charts.
+        * **Data sources:** [Our World In Data](https://ourworldindata.org/covid-vaccinations), [United Nations](https://population.un.org/wpp), [Gapminder](https://www.gapminder.org/data/)
+        * **Disclaimer:** *work in progress; vaccination data in certain regions is reported inconsistently; plot figures are estimated and can not be fully accurate*
+        * Another excellent project using the same data from OWID: [Covidvax.live](https://covidvax.live/)
+    """
+    )
+
+    year = YEAR
 
     ##############################
     # Entry point
@@ -457,68 +353,146 @@ def app():
             st.error(f"Something went wrong. Please try again later.")
             st.stop()
 
-    sorted_unique_locations = sorted(df_vaccination_data_raw.location.unique())
+    with st.expander("Custom regions", expanded=False):
+        definitions = st.text_area(
+            "Define regions, one per line",
+            value="",
+            help="A name, a colon and the locations to sum, separated by commas, e.g. ASEAN: Brunei, Cambodia, Indonesia, Laos, Malaysia, Myanmar, Philippines, Singapore, Thailand, Vietnam",
+            key="regions",
+        )
+        try:
+            region_definitions = regions.parse(
+                definitions, vaccinations.store.locations
+            )
+        except ValueError as e:
+            st.error(e)
+            region_definitions = {}
+    # Hashable, for the caches
+    custom_regions = tuple(region_definitions.items())
+
+    # Sorted once per data snapshot
+    sorted_unique_locations = list(region_definitions) + list(
+        vaccinations.store.locations
+    )
 
     locations = st.multiselect(
         "Select location(s)", sorted_unique_locations, default="World"
     )
     # default="World"
 
+    goals = st.multiselect(
+        "Select vaccination goal(s), %",
+        list(range(5, 101, 5)),
+        default=list(projections.GOALS),
+    )
+    goals = tuple(sorted(goals)) or projections.GOALS
+
+    model = st.selectbox(
+        "Projection model",
+        list(forecasting.MODELS),
+        format_func=forecasting.MODELS.get,
+        help=f"How daily vaccinations are projected: the last reported day, the mean of the last {forecasting.WINDOW} days, exponential smoothing or the linear trend of the last {forecasting.TREND_WINDOW} days",
+    )
+
+    col1, col2 = st.columns((1, 1))
+    with col1:
+        lightweight = st.checkbox(
+            "Lightweight charts",
+            value=False,
+            help=f"Draws at most {MAX_POINTS} points per line, for long histories and slow connections",
+        )
+    with col2:
+        combined = st.checkbox(
+            "Show selected locations in one chart",
+            value=False,
+            help="Compares the share of fully vaccinated people",
+        )
+    max_points = MAX_POINTS if lightweight else None
+
     with st.spinner(
         text="Tip: you can zoom in on and pan the chart, select areas, drag the axes and more..."
     ):
-        for location in locations:
-            df, location_info = process_vaccination_data(
-                df_vaccination_data_raw, location
+        if len(locations) != 0:
+            projections_ = get_projections(
+                vaccinations.store.version, year, goals, model
+            )
+            region_projections = (
+                get_region_projections(
+                    vaccinations.store.version, year, goals, model, custom_regions
+                )
+                if custom_regions
+                else None
             )
 
-            config = {
-                "displaylogo": False,
-                "modeBarButtonsToRemove": [
-                    "resetScale",
-                    "toggleHover",
-                    "toggleSpikelines",
-                    "autoScale2d",
-                    "hoverClosestCartesian",
-                    "hoverCompareCartesian",
-                ],
-            }
-            fig = make_plot(df, location_info, location, year)
-            st.plotly_chart(fig, use_container_width=False, config=config)
-
-            df.reset_index(drop=True, inplace=True)
-
-            with st.expander(label="Show/Hide Dataset", expanded=False):
+        config = {
+            "displaylogo": False,
+            "modeBarButtonsToRemove": [
+                "resetScale",
+                "toggleHover",
+                "toggleSpikelines",
+                "autoScale2d",
+                "hoverClosestCartesian",
+                "hoverCompareCartesian",
+            ],
+        }
+
+        if combined and len(locations) != 0:
+            datas = [
+                data
+                for data in (
+                    process_vaccination_data(projections_, location, region_projections)
+                    for location in locations
+                )
+                if not np.isnan(data.population)
+            ]
+            fig = get_combined_figure(datas, year, max_points, custom_regions)
+            with instrumentation.stage("plotly_chart"):
+                st.plotly_chart(fig, use_container_width=False, config=config)
+
+        for location in locations:
+            data = process_vaccination_data(projections_, location, region_projections)
+
+            # Locations the UN does not report population for
+            if np.isnan(data.population):
+                st.error(
+                    f"Sorry, cannot make a chart for {location}. Here is the raw data instead."
+                )
+                st.dataframe(data.to_frame())
+                st.stop()
+
+            if not combined:
+                fig = get_figure(
+                    data, year, max_points, region_definitions.get(location, ())
+                )
+                with instrumentation.stage("plotly_chart"):
+                    st.plotly_chart(fig, use_container_width=False, config=config)
+
+            # A checkbox rather than an expander, whose contents are built even when collapsed
+            if st.checkbox("Show/Hide Dataset", value=False, key=f"dataset_{location}"):
+                df = data.to_frame()
+
                 st.markdown(
                     """Missing data is indicated with <span style='font-weight:bold;'>nan</span>, <span style='background-color:#ffff00'>duplicate values</span> in <b>daily_vaccinations</b> are the result of missing data, last valid observations were used to fill the gap (forward fill)""",
                     unsafe_allow_html=True,
                 )  # <span style='color:#ff0000; font-weight:bold;'>
 
-                daily_vaccinations_duplicates = df["daily_vaccinations"].duplicated(
-                    keep=False
-                )
-                daily_vaccinations_duplicate_rows = daily_vaccinations_duplicates[
-                    daily_vaccinations_duplicates
-                ].index.values
-                st.dataframe(
-                    df.style.apply(
-                        lambda x: [
-                            "background: yellow"
-                            if x.name in daily_vaccinations_duplicate_rows
-                            else ""
-                            for i in x
-                        ],
-                        axis=1,
-                        subset="daily_vaccinations",
-                    )
+                render_dataset(df, key=f"dataset_page_{location}")
+
+                download_button(
+                    [location],
+                    year,
+                    custom_regions,
+                    label="Download",
+                    key=f"export_{location}",
                 )
 
-                output = StringIO()
-                df.to_csv(output)
-                out = output.getvalue()
-                b64 = base64.b64encode(
-                    out.encode()
-                ).decode()  # strings <-> bytes conversions is necessary here
-                href = f'<a href="data:file/csv;base64,{b64}" download="Vaccination Info - {location}.csv">Download CSV</a>'
-                st.markdown(href, unsafe_allow_html=True)
-                output.close()
+        if len(locations) > 1 and st.checkbox(
+            "Download all selected locations", value=False, key="export_all"
+        ):
+            download_button(
+                locations,
+                year,
+                custom_regions,
+                label="Download zip",
+                key="export_all_button",
+            )
@@ -0,0 +1,120 @@
+"""
+Times the stages of the vaccination goals pipeline on synthetic OWID-shaped data and reports the best wall time and the peak traced memory of every stage per location count
+
+    python -m benchmarks.pipeline [--locations 10 100 1000] [--days 365] [--repeat 3] [--json results.json]
+"""
+import argparse
+import functools
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from apps import vaccination_goals
+from benchmarks import synthetic
+from functions import charts, forecasting, population, projections, vaccinations
+
+
+class Result(NamedTuple):
+    stage: str
+    locations: int
+    days: int
+    rows: int
+    seconds: float
+    peak_bytes: int
+
+
+def measure(func: Callable, repeat: int) -> tuple:
+    """
+    Returns the best wall time of `repeat` calls of `func` and the peak memory traced during one more call; the two are measured apart, as tracing slows allocations down
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return seconds, peak_bytes
+
+
+def run(n_locations: int, n_days: int, repeat: int, workdir: Path) -> list:
+    csv = workdir / f"vaccinations-{n_locations}-{n_days}.csv"
+    synthetic.write_vaccinations(csv, n_locations, n_days)
+
+    def get_vaccination_data():
+        # A fresh store each time, so that every call downloads and parses the whole feed
+        with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+            return vaccinations.VaccinationStore(csv.as_uri(), Path(tmp) / "vaccinations", ttl=0).get()
+
+    df = get_vaccination_data()
+    year = vaccination_goals.YEAR
+    populations = synthetic.make_populations(df["location"].unique(), year)
+    # As in the app; synthetic locations are missing from it and fall back to `populations`
+    population_table = population.get_population_table()
+    base = projections.prepare(df, populations, population_table)
+    projections_ = projections.project_goals(base)
+    # The location with the longest history
+    location = df["location"].value_counts().idxmax()
+    data = vaccination_goals.process_vaccination_data(projections_, location)
+
+    stages = {
+        "get_vaccination_data": get_vaccination_data,
+        "read_population_data": lambda: population.read_column(population.UN_POPULATION, year),
+        "get_populations": lambda: population.get_populations(
+            population.read_column(population.UN_POPULATION, year), population.read_location_codes()
+        ),
+        "daily_population": lambda: population.daily_population(
+            population_table, df["location"].to_numpy(), df["date"].to_numpy()
+        ),
+        "prepare": lambda: projections.prepare(df, populations, population_table),
+        **{
+            f"project_goals ({model})": functools.partial(projections.project_goals, base, projections.GOALS, model)
+            for model in forecasting.MODELS
+        },
+        "process_vaccination_data": lambda: vaccination_goals.process_vaccination_data(projections_, location),
+        "make_plot": lambda: charts.make_plot(data, year),
+        "make_plot (lightweight)": lambda: charts.make_plot(data, year, vaccination_goals.MAX_POINTS),
+    }
+
+    return [Result(stage, n_locations, n_days, len(df), *measure(func, repeat)) for stage, func in stages.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--locations", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"{'stage':<32}{'locations':>10}{'rows':>10}{'best, ms':>12}{'peak, MiB':>12}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_locations in args.locations:
+            for result in run(n_locations, args.days, args.repeat, Path(workdir)):
+                results.append(result)
+                print(
+                    f"{result.stage:<32}{result.locations:>10}{result.rows:>10}"
+                    f"{result.seconds * 1000:>12.2f}{result.peak_bytes / 2 ** 20:>12.2f}"
+                )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump([result._asdict() for result in results], f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from functions import population
+
+# Columns of the OWID vaccinations feed, in the order they are published
+COLUMNS = [
+    "location",
+    "iso_code",
+    "date",
+    "total_vaccinations",
+    "people_vaccinated",
+    "people_fully_vaccinated",
+    "total_boosters",
+    "daily_vaccinations_raw",
+    "daily_vaccinations",
+    "total_vaccinations_per_hundred",
+    "people_vaccinated_per_hundred",
+    "people_fully_vaccinated_per_hundred",
+    "total_boosters_per_hundred",
+    "daily_vaccinations_per_million",
+    "daily_people_vaccinated",
+    "daily_people_vaccinated_per_hundred",
+]
+
+START_DATE = "2020-12-01"
+
+
+def location_names(n_locations: int) -> list:
+    '''Returns `n_locations` location names: real OWID locations with a UN population first, so that the whole pipeline runs on them, then synthetic ones.
+    '''
+    names = [location for location, code in sorted(population.read_location_codes().items()) if code is not None]
+
+    return names[:n_locations] + [f"Synthetic {i}" for i in range(len(names), n_locations)]
+
+
+def make_vaccinations(n_locations: int, n_days: int, seed: int = 0) -> pd.DataFrame:
+    '''Deterministic OWID-shaped vaccinations frame with `n_locations` locations of up to `n_days` days each. Locations start reporting on different days and daily counts ramp up with noise and gaps, like the real feed.
+    '''
+    rng = np.random.default_rng(seed)
+    names = location_names(n_locations)
+
+    # Later starters have shorter histories
+    starts = rng.integers(0, max(n_days // 4, 1), n_locations)
+    lengths = n_days - starts
+    location = np.repeat(np.arange(n_locations), lengths)
+    day = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[location]
+
+    scale = rng.lognormal(9, 2, n_locations)[location]
+    ramp = np.minimum(1, (day - starts[location] + 1) / 60)
+    daily = np.round(scale * ramp * rng.lognormal(0, 0.2, len(day)))
+    # Gaps in reporting, never on the first day of a location
+    daily[(rng.random(len(day)) < 0.02) & (day != starts[location])] = np.nan
+
+    total = pd.Series(np.nan_to_num(daily)).groupby(location).cumsum().to_numpy()
+    people = np.round(total * 0.6)
+    fully = np.round(total * 0.4)
+
+    return pd.DataFrame(
+        {
+            "location": np.asarray(names, dtype=object)[location],
+            "iso_code": [f"S{i:02X}" for i in location],
+            "date": pd.Timestamp(START_DATE) + pd.to_timedelta(day, unit="D"),
+            "total_vaccinations": total,
+            "people_vaccinated": people,
+            "people_fully_vaccinated": fully,
+            "total_boosters": np.nan,
+            "daily_vaccinations_raw": daily,
+            "daily_vaccinations": daily,
+            "total_vaccinations_per_hundred": np.nan,
+            "people_vaccinated_per_hundred": np.nan,
+            "people_fully_vaccinated_per_hundred": np.nan,
+            "total_boosters_per_hundred": np.nan,
+            "daily_vaccinations_per_million": np.nan,
+            "daily_people_vaccinated": np.nan,
+            "daily_people_vaccinated_per_hundred": np.nan,
+        },
+        columns=COLUMNS,
+    )
+
+
+def write_vaccinations(path, n_locations: int, n_days: int, seed: int = 0) -> None:
+    '''Writes `make_vaccinations` to a CSV file at `path`.
+    '''
+    make_vaccinations(n_locations, n_days, seed).to_csv(path, index=False, date_format="%Y-%m-%d")
+
+
+def make_populations(locations, year: str = "2020", seed: int = 0) -> pd.Series:
+    '''Population of every location in `locations`: the UN figures where the location has a code, synthetic ones otherwise.
+    '''
+    rng = np.random.default_rng(seed)
+    populations = population.get_populations(
+        population.read_column(population.UN_POPULATION, year), population.read_location_codes()
+    )
+    populations = populations.reindex(locations)
+
+    return populations.fillna(pd.Series(rng.lognormal(15, 2, len(locations)).round(), index=populations.index))
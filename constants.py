@@ -1,3 +1,6 @@
 from pathlib import Path
 
-ROOT = Path(__file__).parent
\ No newline at end of file
+ROOT = Path(__file__).parent
+
+# Local, per-host caches of downloaded data and rendered figures
+CACHE_DIR = ROOT / "apps" / "data" / "cache"
@@ -0,0 +1,236 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import PurePath
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+# One card per line of an Anki "Notes in Plain Text" export: front, back and tags separated by tabs
+ROW = re.compile(r"^(.*)\t(.*)\t(.*)")
+
+# Note format name -> function turning the fields of a card into an Obsidian flashcard block
+FORMATTERS: Dict[str, Callable[[str, str, str], str]] = {}
+
+# Lines converted between progress reports
+CHUNK = 5000
+# Bytes read at a time while digesting uploads
+READ_SIZE = 2 ** 20
+
+# Limits on the decompressed size of every zip member and of a whole upload, against zip bombs
+MAX_MEMBER_SIZE = int(os.environ.get("ANKI_MAX_MEMBER_SIZE", 100 * 2 ** 20))
+MAX_TOTAL_SIZE = int(os.environ.get("ANKI_MAX_TOTAL_SIZE", 200 * 2 ** 20))
+
+
+class Upload(NamedTuple):
+    '''Uploaded files (exports or zip archives of them), with a SHA-256 digest of their names and contents to key cached conversions by.
+    '''
+    files: Tuple[BinaryIO, ...]
+    digest: str
+
+
+class Progress(NamedTuple):
+    cards: int
+    bytes_read: int
+    bytes_total: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        '''Bytes per second.
+        '''
+        return self.bytes_read / self.seconds if self.seconds > 0 else 0.0
+
+
+def formatter(name: str):
+    '''Registers the decorated function as the formatter of note format `name`. It is called with the front, back and tags of every card.
+    '''
+
+    def register(func):
+        FORMATTERS[name] = func
+        return func
+
+    return register
+
+
+@formatter("Basic")
+def basic(front: str, back: str, tags: str) -> str:
+    return f"START\nBasic\n{front}\nBack: {back}\nTags: {tags}\nEND\n\n"
+
+
+@formatter("Reversed")
+def reversed_(front: str, back: str, tags: str) -> str:
+    return f"START\nBasic (and reversed card)\n{front}\nBack: {back}\nTags: {tags}\nEND\n\n"
+
+
+@formatter("Cloze")
+def cloze(text: str, extra: str, tags: str) -> str:
+    # The cloze deletions ({{c1::...}}) are kept as they are in the text field
+    return f"START\nCloze\n{text}\nBack Extra: {extra}\nTags: {tags}\nEND\n\n"
+
+
+def read_lines(file: BinaryIO, encoding: str = "utf-8") -> Iterator[str]:
+    '''Yields the decoded lines of a binary `file` one at a time, without reading it whole.
+    '''
+    file.seek(0)
+    text = io.TextIOWrapper(file, encoding=encoding)
+    try:
+        yield from text
+    finally:
+        # Leaves `file` open for its owner
+        text.detach()
+
+
+def convert(lines: Iterable[str], option: str) -> Iterator[Tuple[str, bool]]:
+    '''Yields the Markdown for every line of an export and whether the line was a card. Cards become Obsidian flashcard blocks in note format `option`, other lines are passed through unchanged.
+    '''
+    try:
+        format_card = FORMATTERS[option]
+    except KeyError:
+        raise ValueError(f"Unknown note format {option!r}, expected one of {', '.join(FORMATTERS)}") from None
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        match = ROW.match(line)
+        if match is None:
+            yield line + "\n", False
+        else:
+            yield format_card(*match.groups()) + "\n", True
+
+
+def convert_file(
+    file: BinaryIO, option: str, out: TextIO, on_progress: Optional[Callable[[Progress], None]] = None
+) -> Progress:
+    '''Converts the export `file` record by record into `out`, calling `on_progress` every `CHUNK` lines and once at the end. Returns the final progress.
+    '''
+    bytes_total = file.seek(0, io.SEEK_END)
+    start = time.perf_counter()
+
+    cards = 0
+    for i, (record, is_card) in enumerate(convert(read_lines(file), option), 1):
+        out.write(record)
+        cards += is_card
+
+        if on_progress is not None and i % CHUNK == 0:
+            # Position of the decoder in the file, accurate to its read-ahead buffer
+            on_progress(Progress(cards, file.tell(), bytes_total, time.perf_counter() - start))
+
+    progress = Progress(cards, bytes_total, bytes_total, time.perf_counter() - start)
+    if on_progress is not None:
+        on_progress(progress)
+
+    return progress
+
+
+def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, limit: int) -> bytes:
+    # The sizes in the archive directory can be forged, so the limit is also enforced while decompressing
+    if info.file_size > limit:
+        raise ValueError(f"{info.filename} is too large once decompressed (limit {limit:,} bytes)")
+    with archive.open(info) as member:
+        data = member.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"{info.filename} is too large once decompressed (limit {limit:,} bytes)")
+
+    return data
+
+
+def read_exports(
+    files: Iterable[BinaryIO], max_member_size: int = MAX_MEMBER_SIZE, max_total_size: int = MAX_TOTAL_SIZE
+) -> Iterator[Tuple[str, BinaryIO]]:
+    '''Yields the deck name and a binary file of every export in `files`. Plain exports are yielded as they are, without a copy; zip archives are expanded one `.txt` member at a time. Raises `ValueError` once a member exceeds `max_member_size` bytes or all exports together exceed `max_total_size` bytes.
+    '''
+    total = 0
+    for file in files:
+        file.seek(0)
+        if zipfile.is_zipfile(file):
+            file.seek(0)
+            with zipfile.ZipFile(file) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(".txt"):
+                        data = _read_member(archive, info, min(max_member_size, max_total_size - total))
+                        total += len(data)
+                        yield PurePath(info.filename).stem, io.BytesIO(data)
+        else:
+            total += file.seek(0, io.SEEK_END)
+            if total > max_total_size:
+                raise ValueError(f"The upload is larger than {max_total_size:,} bytes")
+            file.seek(0)
+            yield PurePath(getattr(file, "name", "deck")).stem, file
+
+
+def read_upload(files: Iterable[BinaryIO]) -> Upload:
+    '''Digests the uploaded `files` in chunks, without reading them whole or expanding archives.
+    '''
+    files = tuple(files)
+
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(getattr(file, "name", "").encode())
+        digest.update(file.seek(0, io.SEEK_END).to_bytes(8, "little"))
+        file.seek(0)
+        for chunk in iter(lambda: file.read(READ_SIZE), b""):
+            digest.update(chunk)
+        file.seek(0)
+
+    return Upload(files, digest.hexdigest())
+
+
+def convert_deck(name: str, data: bytes, option: str) -> Tuple[str, str, int]:
+    '''Converts a single export held in memory. Returns the deck name, its Markdown and the number of cards; runs in the worker processes of `convert_batch`.
+    '''
+    out = io.StringIO()
+    progress = convert_file(io.BytesIO(data), option, out)
+
+    return name, out.getvalue(), progress.cards
+
+
+def convert_batch(
+    exports: List[Tuple[str, BinaryIO]],
+    option: str,
+    out: BinaryIO,
+    max_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+) -> Dict[str, int]:
+    '''Converts `exports` (deck name and binary file) in parallel on a process pool and writes them into the zip archive `out`, one Markdown file per deck. Calls `on_progress` after every deck. Returns the number of cards of every deck, keyed by file name in the archive.
+    '''
+    if option not in FORMATTERS:
+        raise ValueError(f"Unknown note format {option!r}, expected one of {', '.join(FORMATTERS)}")
+
+    sizes = [file.seek(0, io.SEEK_END) for _, file in exports]
+    bytes_total = sum(sizes)
+    max_workers = max_workers or min(len(exports), os.cpu_count() or 1) or 1
+    start = time.perf_counter()
+
+    decks = {}
+    cards = bytes_read = 0
+    # Spawned rather than forked: the Streamlit server is multithreaded, and a fork copies locks other threads may hold
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers, mp_context=context) as executor, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        futures = {}
+        for (name, file), size in zip(exports, sizes):
+            file.seek(0)
+            futures[executor.submit(convert_deck, name, file.read(), option)] = size
+
+        # Written in completion order, so that a large deck does not hold up the rest
+        for future in as_completed(futures):
+            name, markdown, deck_cards = future.result()
+
+            file_name = f"{name}.md"
+            # Decks of the same name from different archives or folders
+            n = 1
+            while file_name in decks:
+                n += 1
+                file_name = f"{name} ({n}).md"
+
+            archive.writestr(file_name, markdown)
+            decks[file_name] = deck_cards
+
+            cards += deck_cards
+            bytes_read += futures[future]
+            if on_progress is not None:
+                on_progress(Progress(cards, bytes_read, bytes_total, time.perf_counter() - start))
+
+    return decks
@@ -0,0 +1,264 @@
+import humanize
+import pandas as pd
+import plotly.graph_objects as go
+
+from functions import downsampling, projections
+
+# Part of the keys of cached charts (the figure cache of the app and the reports); bump when their layout changes
+VERSION = 1
+
+
+def make_plot(
+    data: projections.LocationData, year, max_points: int = None
+) -> go.Figure:
+    """Plots the cumulative and daily vaccinations of one location with its goal markers; `max_points` downsamples every trace for lightweight charts."""
+    # ---------------------------------------------------------------------------------------------------------
+
+    # Downsamples to `max_points` per trace; the cumulative line keeps its shape, the daily one its peaks
+    if max_points is None:
+        total = daily = slice(None)
+    else:
+        total = downsampling.lttb(data.date, data.daily_vaccinations_cumsum, max_points)
+        daily = downsampling.minmax(data.daily_vaccinations, max_points)
+
+    fig = go.Figure()
+
+    fig.add_trace(
+        go.Line(
+            x=data.date[total],
+            y=data.daily_vaccinations_cumsum[total],
+            name="total",
+            hoverinfo="y",
+            hovertemplate="%{y:,}",
+            yaxis="y1",
+            fill="tozeroy",
+            marker_color="rgba(115, 65, 225, 0.5)",
+            marker_line_width=0,
+        )
+    )
+
+    # White "halo" under the daily line; lightweight charts skip the duplicate trace and draw a wider line instead
+    if max_points is None:
+        fig.add_trace(
+            go.Line(
+                x=data.date,
+                y=data.daily_vaccinations,
+                name="daily",
+                hoverinfo="skip",
+                hovertemplate=None,
+                yaxis="y2",
+                marker_color="#ffffff",
+                marker_line_width=0,
+                line=dict(color="#ffffff", width=6),
+            )
+        )
+    fig.add_trace(
+        go.Line(
+            x=data.date[daily],
+            y=data.daily_vaccinations[daily],
+            name="daily",
+            hoverinfo="y",
+            hovertemplate="%{y:,}",
+            yaxis="y2",
+            marker_color="Red",
+            marker_line_width=0,
+            line=dict(color="Red", width=2 if max_points is None else 3),
+        )
+    )
+
+    fig.update_layout(
+        xaxis=dict(
+            title="<b>Days</b>",
+            showgrid=False,
+            # layer="above traces",
+        ),
+        yaxis=dict(
+            title="<b>Total vaccinations,</b> shots (cumulative daily sum)",
+            # titlefont=dict(
+            #     color="#1f77b4"
+            # ),
+            # tickfont=dict(
+            #     color="#1f77b4"
+            # ),
+            showgrid=False,
+            anchor="x",
+            rangemode="tozero",
+        ),
+        yaxis2=dict(
+            title="<b>Daily vaccinations,</b> shots",
+            # titlefont=dict(
+            #     color="#1f77b4"
+            # ),
+            # tickfont=dict(
+            #     color="#1f77b4"
+            # ),
+            anchor="x",
+            overlaying="y1",
+            side="right",
+            showgrid=False,
+            rangemode="nonnegative",
+            scaleanchor="y1",
+            scaleratio=50,
+        ),
+    )
+
+    # ---------------------------------------------------------------------------------------------------------------------------
+
+    _population = int(data.population)
+    _vacc_start_date = data.vacc_start_date
+    _date = data.last_date
+    _vaccinated_people = int(data.vaccinated_people)
+    _daily_vaccinations = data.last_daily_vaccinations
+
+    fig.add_annotation(
+        text=f"<b>Population:</b> {humanize.intword(_population)} ({year})<br><b>Vaccination started:</b> {_vacc_start_date:%B %d, %Y}<br><b>{_date:%B %d, %Y}:</b> {_vaccinated_people:,} ({int(_vaccinated_people*100/int(_population))}%) people<br>have received at least 2 doses of vaccine,<br>{int(_daily_vaccinations):,} shots were administered",
+        align="left",
+        x=0.05,
+        y=0.95,
+        xref="paper",
+        yref="paper",
+        # hovertext=f"",
+        showarrow=False,
+        # xanchor="right",
+        # xshift=-10,
+        bgcolor="rgba(245, 247, 243, 0.85)",
+    )
+
+    # ---------------------------------------------------------------------------------------------------------------------------
+
+    def add_goal_marker(
+        goal: projections.Goal, xanchor: str, xshift: int, text: str = None
+    ) -> None:
+        xanchor = xanchor
+        xshift = xshift
+        # Goals already reached, including those the model gives no date for
+        if not goal.days_to_goal > 0:
+            text = f"<b>{goal.perc}%</b>"
+            font_color = "Green"
+            color = "Green"
+            xanchor = "right"
+            xshift = 5
+        else:
+            text = text or f"<b>{goal.perc}%</b>"
+            font_color = "Orange"
+            color = "Orange"
+        fig.add_annotation(
+            text=text,
+            align="center",
+            x=goal.marker_date,
+            y=goal.marker_vaccinations,
+            font_color=font_color,
+            # arrowcolor="Red",
+            # arrowhead=1,
+            # hovertext=f"",
+            showarrow=False,
+            yanchor="bottom",
+            xanchor=xanchor,
+            xshift=xshift,
+            bgcolor="rgba(255,255,255,0.85)",
+        )
+        if max_points is None:
+            fig.add_shape(
+                type="line",
+                x0=goal.marker_date,
+                y0=0,
+                x1=goal.marker_date,
+                y1=goal.marker_vaccinations,
+                line=dict(
+                    color="White",
+                    width=2,
+                    # dash="dot"
+                ),
+            )
+        fig.add_shape(
+            type="line",
+            x0=goal.marker_date,
+            y0=0,
+            x1=goal.marker_date,
+            y1=goal.marker_vaccinations,
+            line=dict(color=color, width=2, dash="dot"),
+        )
+        return None
+
+    # humanize.naturalday(dt.datetime.now() - dt.timedelta(days=1))
+
+    def get_annotation_for_goal_marker(goal: projections.Goal) -> str:
+        return "<b>-- {_perc}% --</b><br>in <b>{_days_to_goal} day(s)</b><br><b>({_goal_date:%B %Y})</b><br>~ {_goal_vaccinations} doses".format(
+            _perc=goal.perc,
+            _days_to_goal=int(goal.days_to_goal),
+            _goal_date=goal.date,
+            _goal_vaccinations=humanize.intword(int(goal.vaccinations)),
+        )
+
+    # Goals the model never reaches have no date and are left out; the two highest of the rest carry a detailed annotation
+    goals = sorted(goal for goal in data.goals if not pd.isnull(goal.marker_date))
+    for goal in goals[:-2]:
+        add_goal_marker(goal, "right", 5)
+    for goal in goals[-2:]:
+        add_goal_marker(
+            goal,
+            "left",
+            -5,
+            get_annotation_for_goal_marker(goal) if goal.days_to_goal > 0 else None,
+        )
+
+    fig.update_layout(
+        {"plot_bgcolor": "#f5f7f3", "paper_bgcolor": "#f5f7f3"},
+        hovermode="x",
+        hoverlabel=dict(font_color="white"),
+        title_text=f"{data.location}",
+        width=800,
+        showlegend=False,
+    )
+
+    # fig.update_xaxes(ticklabelmode="period")
+
+    return fig
+
+
+def make_combined_plot(datas: list, year, max_points: int = None) -> go.Figure:
+    """Plots the share of fully vaccinated people of several locations in one chart."""
+    fig = go.Figure()
+
+    for data in datas:
+        if max_points is None:
+            index = slice(None)
+        else:
+            index = downsampling.lttb(
+                data.date, data.percent_fully_vaccinated, max_points
+            )
+        fig.add_trace(
+            go.Scatter(
+                x=data.date[index],
+                y=data.percent_fully_vaccinated[index],
+                name=data.location,
+                mode="lines",
+                hovertemplate="%{y:.1f}%",
+            )
+        )
+
+    for perc in sorted({goal.perc for data in datas for goal in data.goals}):
+        fig.add_shape(
+            type="line",
+            xref="paper",
+            x0=0,
+            x1=1,
+            y0=perc,
+            y1=perc,
+            line=dict(color="Orange", width=1, dash="dot"),
+        )
+
+    fig.update_layout(
+        {"plot_bgcolor": "#f5f7f3", "paper_bgcolor": "#f5f7f3"},
+        xaxis=dict(title="<b>Days</b>", showgrid=False),
+        yaxis=dict(
+            title="<b>Fully vaccinated,</b> % of population",
+            showgrid=False,
+            rangemode="tozero",
+        ),
+        hovermode="x",
+        title_text=", ".join(data.location for data in datas),
+        width=800,
+    )
+
+    return fig
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def _valid(y: np.ndarray) -> np.ndarray:
+    # Missing values are left out of the sample
+    return np.flatnonzero(np.isfinite(np.asarray(y, dtype=float)))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    '''Largest-Triangle-Three-Buckets downsampling. Returns the sorted indices of at most `n_out` points of (`x`, `y`) that keep the visual shape of the line; suits smooth series such as cumulative sums. `x` may be numeric or datetime.
+    '''
+    valid = _valid(y)
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid
+
+    x = np.asarray(x)[valid]
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[ns]").astype(np.int64)
+    x = x.astype(float)
+    y = np.asarray(y, dtype=float)[valid]
+
+    # The first and last points are kept, the rest are split into `n_out - 2` buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])
+
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Picks the point forming the largest triangle with the previous pick and the next bucket's mean
+        area = np.abs(
+            (x[a] - mean_x[i + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (mean_y[i + 1] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return valid[indices]
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    '''Min/max bucketing. Splits `y` into `n_out // 2` buckets and returns the sorted indices of the minimum and maximum of each; keeps the peaks of noisy series such as daily counts.
+    '''
+    valid = _valid(y)
+    n = len(valid)
+    if n_out >= n or n_out < 2:
+        return valid
+
+    y = np.asarray(y, dtype=float)[valid]
+
+    n_buckets = n_out // 2
+    bucket = np.arange(n) * n_buckets // n
+
+    # Sorted by bucket, then value: the first point of each bucket is its minimum, the last one its maximum
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+
+    return valid[np.unique(np.concatenate([order[starts], order[ends]]))]
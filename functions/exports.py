@@ -0,0 +1,48 @@
+import gzip
+import io
+import zipfile
+from typing import Dict, NamedTuple
+
+import pandas as pd
+
+
+class Format(NamedTuple):
+    label: str
+    extension: str
+    mime: str
+
+
+FORMATS = {
+    "csv": Format("CSV", ".csv", "text/csv"),
+    "csv.gz": Format("CSV, gzip-compressed", ".csv.gz", "application/gzip"),
+    # pyarrow is a dependency of Streamlit
+    "parquet": Format("Parquet", ".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def to_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    '''Serializes `df` in one of `FORMATS`.
+    '''
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    if fmt == "csv.gz":
+        # mtime=0 keeps the output, and with it any cache keyed by it, deterministic
+        return gzip.compress(df.to_csv(index=False).encode(), mtime=0)
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+
+    raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+
+def bundle(files: Dict[str, bytes]) -> bytes:
+    '''Zips already serialized `files`, keyed by file name. Compressed formats are stored as they are.
+    '''
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            compress_type = zipfile.ZIP_DEFLATED if name.endswith(".csv") else zipfile.ZIP_STORED
+            archive.writestr(name, data, compress_type=compress_type)
+
+    return buffer.getvalue()
@@ -0,0 +1,75 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from constants import CACHE_DIR
+
+# Total size of compressed figures kept on disk
+MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class FigureCache:
+    '''Least recently used cache of serialized Plotly figures in a SQLite database, so that every worker process on the host shares it. Figures are stored as zlib-compressed JSON; when their total size exceeds `max_bytes`, the least recently used ones are evicted.
+    '''
+
+    def __init__(self, path: Path = CACHE_DIR / "figures.sqlite3", max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS figures (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS figures_accessed ON figures (accessed)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call, as Streamlit serves sessions from many threads
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return json.dumps(parts, default=str)
+
+    def get(self, key: str) -> Optional[str]:
+        '''Returns the figure JSON stored under `key`, or `None`.
+        '''
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM figures WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE figures SET accessed = ? WHERE key = ?", (time.time(), key))
+
+        return zlib.decompress(row[0]).decode()
+
+    def put(self, key: str, figure_json: str) -> None:
+        '''Stores `figure_json` under `key` and evicts the least recently used figures over the size budget.
+        '''
+        value = zlib.compress(figure_json.encode())
+
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO figures (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM figures").fetchone()[0]
+            if total > self.max_bytes:
+                # Walks the figures from the least recently used one until enough space is freed
+                for evict_key, size in db.execute("SELECT key, size FROM figures ORDER BY accessed").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM figures WHERE key = ?", (evict_key,))
+                    total -= size
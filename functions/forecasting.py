@@ -0,0 +1,100 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# Model name -> label shown in the app
+MODELS = {
+    "last": "Last value",
+    "rolling_mean": "Rolling mean",
+    "exponential": "Exponential smoothing",
+    "trend": "Linear trend",
+}
+DEFAULT = "last"
+
+# Days averaged by the rolling mean
+WINDOW = 7
+# Smoothing factor of exponential smoothing; higher values follow recent days more closely
+ALPHA = 0.3
+# Days the linear trend is fitted to
+TREND_WINDOW = 28
+
+
+class Forecast(NamedTuple):
+    '''Daily vaccinations projected for every location: `rate` at the last observation, changing by `slope` every day after it (zero for all models but the trend).
+    '''
+    rate: np.ndarray
+    slope: np.ndarray
+
+
+def _segment_sums(weights: np.ndarray, values: np.ndarray, starts: np.ndarray) -> tuple:
+    # Weighted sums per location of a series sorted by location; missing values carry no weight
+    finite = np.isfinite(values)
+    weights = np.where(finite, weights, 0.0)
+    values = np.where(finite, values, 0.0)
+
+    return np.add.reduceat(weights, starts), np.add.reduceat(weights * values, starts)
+
+
+def forecast(model: str, date: np.ndarray, values: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> Forecast:
+    '''Projects the daily vaccinations of all locations at once with `model` (see `MODELS`). `date` and `values` hold the daily series of every location, sorted by location and date; the rows of location `i` are `starts[i]:stops[i]`, and rows between `stops[i]` and `starts[i + 1]` are left out.
+    '''
+    values = np.asarray(values, dtype=float)
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+    if len(starts) == 0:
+        return Forecast(np.empty(0), np.empty(0))
+
+    # Location of every row; rows outside the ranges carry no weight, like missing values
+    position = np.arange(len(values))
+    segment = np.searchsorted(starts, position, side="right") - 1
+    values = np.where((segment >= 0) & (position < stops[segment]), values, np.nan)
+
+    # Days before the last observation of the location, for every row
+    age = (date[stops[segment] - 1] - date) / np.timedelta64(1, "D")
+    slope = np.zeros(len(starts))
+
+    if model == "last":
+        rate = values[stops - 1]
+    elif model == "rolling_mean":
+        weight, total = _segment_sums((age < WINDOW).astype(float), values, starts)
+        with np.errstate(invalid="ignore"):
+            rate = total / weight
+    elif model == "exponential":
+        weight, total = _segment_sums((1 - ALPHA) ** age, values, starts)
+        with np.errstate(invalid="ignore"):
+            rate = total / weight
+    elif model == "trend":
+        # Least-squares line through the last `TREND_WINDOW` days, evaluated at the last observation (t = 0)
+        recent = (age < TREND_WINDOW).astype(float)
+        t = -age
+        n, sum_y = _segment_sums(recent, values, starts)
+        _, sum_t = _segment_sums(recent, np.where(np.isfinite(values), t, np.nan), starts)
+        _, sum_tt = _segment_sums(recent, np.where(np.isfinite(values), t * t, np.nan), starts)
+        _, sum_ty = _segment_sums(recent, t * values, starts)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (n * sum_ty - sum_t * sum_y) / (n * sum_tt - sum_t ** 2)
+            # A single observation has no trend
+            slope = np.where(np.isfinite(slope), slope, 0.0)
+            rate = (sum_y - slope * sum_t) / n
+    else:
+        raise ValueError(f"Unknown model {model!r}, expected one of {', '.join(MODELS)}")
+
+    return Forecast(rate, slope)
+
+
+def days_to_reach(remaining: np.ndarray, forecast_: Forecast) -> np.ndarray:
+    '''Days until the vaccinations in `remaining` (locations, thresholds) are given at the forecast rate, or `NaN` if they never are. Solves rate * d + slope * d ** 2 / 2 = remaining for the first d.
+    '''
+    rate = forecast_.rate[:, None]
+    slope = forecast_.slope[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Same root as (-rate + sqrt(...)) / slope, but also valid when the slope is zero
+        denominator = rate + np.sqrt(rate ** 2 + 2 * slope * remaining)
+        days = 2 * remaining / denominator
+        # A falling rate that is already negative only reaches the remaining doses "in the past": never
+        days[(remaining > 0) & ~((denominator > 0) & (days > 0))] = np.nan
+    days[~np.isfinite(days)] = np.nan
+
+    return days
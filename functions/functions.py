@@ -1,26 +1,95 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
 from constants import ROOT
 
+# Directories that never hold static files for the pages
+SKIP_DIRS = {".git", ".streamlit", "__pycache__", "data", "venv", ".venv"}
+
+# Opening and closing tags that embed a file with Streamlit, by extension
+TAGS = {
+    "js": ("<script>", "</script>"),
+    "css": ("<style>", "</style>"),
+    "html": ("", ""),
+}
+
+
+class Asset(NamedTuple):
+    mtime: int
+    text: str
+    wrapped: str
+
+
+class AssetRegistry:
+    '''Index of the static files under `root`, built once and keyed both by file name and by path relative to `root`. File contents are read on first use and kept in memory, together with their tag-wrapped variant; an entry is re-read only when the modification time of its file changes.
+    '''
+
+    def __init__(self, root: Path = ROOT):
+        self.root = Path(root)
+
+        self._lock = threading.Lock()
+        self._paths: Dict[str, Path] = {}
+        self._assets: Dict[Path, Asset] = {}
+        self.index()
+
+    def index(self) -> None:
+        '''(Re)builds the index of file names and relative paths.
+        '''
+        paths = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            for filename in sorted(filenames):
+                path = Path(dirpath, filename)
+                # Every trailing part of the relative path is a key, so "sketch.js", "home/sketch.js" and
+                # "apps/home/sketch.js" all resolve; like the former `rglob` lookup, the first match wins
+                parts = path.relative_to(self.root).parts
+                for i in range(len(parts)):
+                    paths.setdefault("/".join(parts[i:]), path)
+
+        with self._lock:
+            self._paths = paths
+
+    def resolve(self, file: str) -> Path:
+        path = self._paths.get(file)
+        if path is None:
+            # The file may have been added since the index was built
+            self.index()
+            path = self._paths.get(file)
+            if path is None:
+                raise FileNotFoundError(f"No static file {file!r} under {self.root}")
+
+        return path
+
+    def get(self, file: str) -> Asset:
+        '''Returns the cached contents of `file` (a name or a relative path), reading it again if it has changed on disk.
+        '''
+        path = self.resolve(file)
+        mtime = path.stat().st_mtime_ns
+
+        asset: Optional[Asset] = self._assets.get(path)
+        if asset is None or asset.mtime != mtime:
+            with open(path) as f:
+                text = f.read()
+
+            # Files of other types are embedded as nothing
+            opening, closing = TAGS.get(path.suffix[1:], (None, None))
+            wrapped = "" if opening is None else f"{opening}{text}{closing}"
+
+            asset = Asset(mtime, text, wrapped)
+            with self._lock:
+                self._assets[path] = asset
+
+        return asset
+
+
+assets = AssetRegistry()
+
 
 def load_static(file: str, tags: bool = True) -> str:
-    '''Loader for text files to be embedded with Streamlit. Takes path to a `file` as main argument. If `tags` is set to `True`, surrounds the text with script tags (e.g. <style>), else returns just the text.
+    '''Loader for text files to be embedded with Streamlit. Takes the name or relative path of a `file` as main argument. If `tags` is set to `True`, surrounds the text with script tags (e.g. <style>), else returns just the text.
     '''
-    from pathlib import Path
-
-    import constants
-
-    ext = file.split('.')[-1]
-    
-    with open(list(Path(constants.ROOT).rglob(file))[0]) as f :
-        static_file = f.read()
-    
-    if tags == True :
-        if ext == "js" :
-            return f"<script>{static_file}</script>"
-        elif ext == "css" :
-            return f"<style>{static_file}</style>"
-        elif ext == "html" :
-            return static_file
-        else :
-            return ""
-    elif tags == False :
-         return static_file
+    asset = assets.get(file)
+
+    return asset.wrapped if tags else asset.text
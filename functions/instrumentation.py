@@ -0,0 +1,161 @@
+import functools
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, NamedTuple, Tuple
+
+# Off unless set: "1" records wall and CPU time, "memory" also traces allocations (which slows them down)
+INSTRUMENTATION = os.environ.get("INSTRUMENTATION", "").lower()
+ENABLED = INSTRUMENTATION not in ("", "0", "false", "off")
+TRACE_MEMORY = INSTRUMENTATION == "memory"
+
+# Samples per stage the percentiles are computed over
+WINDOW = int(os.environ.get("INSTRUMENTATION_WINDOW", 1000))
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Sample(NamedTuple):
+    wall: float
+    cpu: float
+    memory: int
+
+
+class Metrics:
+    '''Rolling window of the latest samples of a stage, plus running totals since the start of the process.
+    '''
+
+    def __init__(self, window: int = WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.totals = Sample(0.0, 0.0, 0)
+
+    def add(self, sample: Sample) -> None:
+        self.samples.append(sample)
+        self.count += 1
+        self.totals = Sample(*(total + value for total, value in zip(self.totals, sample)))
+
+    def quantiles(self, field: str) -> Dict[float, float]:
+        '''Nearest-rank quantiles of `field` over the window.
+        '''
+        values = sorted(getattr(sample, field) for sample in self.samples)
+        if not values:
+            return {}
+
+        return {q: values[min(int(q * len(values)), len(values) - 1)] for q in QUANTILES}
+
+
+_lock = threading.Lock()
+# (kind, name) -> metrics; kind is "app" for the router and "stage" for anything else
+_metrics: Dict[Tuple[str, str], Metrics] = {}
+
+if TRACE_MEMORY:
+    tracemalloc.start()
+
+# Shared no-op returned while disabled
+_disabled = nullcontext()
+
+
+def record(name: str, sample: Sample, kind: str = "stage") -> None:
+    with _lock:
+        metrics = _metrics.get((kind, name))
+        if metrics is None:
+            metrics = _metrics[(kind, name)] = Metrics()
+        metrics.add(sample)
+
+
+@contextmanager
+def _measure(name: str, kind: str):
+    memory = tracemalloc.get_traced_memory()[0] if TRACE_MEMORY else 0
+    # CPU time of the calling thread only, as Streamlit runs every session on its own thread
+    cpu = time.thread_time()
+    wall = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(
+            name,
+            Sample(
+                time.perf_counter() - wall,
+                time.thread_time() - cpu,
+                # Net allocations that outlived the stage
+                tracemalloc.get_traced_memory()[0] - memory if TRACE_MEMORY else 0,
+            ),
+            kind,
+        )
+
+
+def stage(name: str, kind: str = "stage"):
+    '''Context manager recording the wall time, CPU time and net allocated memory of its block under `name`. A no-op unless instrumentation is enabled.
+    '''
+    return _measure(name, kind) if ENABLED else _disabled
+
+
+def timed(name: str = None, kind: str = "stage"):
+    '''Decorator recording every call of a function as a stage named `name` (the function name by default). Returns the function unchanged unless instrumentation is enabled.
+    '''
+
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _measure(stage_name, kind):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def snapshot() -> Dict[Tuple[str, str], Metrics]:
+    with _lock:
+        return dict(_metrics)
+
+
+def summary() -> List[dict]:
+    '''One row per stage with its sample count and the rolling quantiles of wall time, CPU time (in milliseconds) and memory (in bytes).
+    '''
+    rows = []
+    for (kind, name), metrics in sorted(snapshot().items()):
+        row = {"kind": kind, "name": name, "count": metrics.count}
+        for field, scale, unit in (("wall", 1000, "ms"), ("cpu", 1000, "ms"), ("memory", 1, "B")):
+            for q, value in metrics.quantiles(field).items():
+                row[f"{field} p{int(q * 100)}, {unit}"] = value * scale
+        rows.append(row)
+
+    return rows
+
+
+def prometheus(prefix: str = "sy_projects") -> str:
+    '''Dumps the metrics in the Prometheus text exposition format, as one summary per kind and measurement.
+    '''
+    metrics = sorted(snapshot().items())
+
+    lines = []
+    for kind in sorted({kind for (kind, _), _ in metrics}):
+        for field, unit, help_text in (
+            ("wall", "seconds", "Wall time"),
+            ("cpu", "seconds", "CPU time of the calling thread"),
+            ("memory", "bytes", "Net allocated memory"),
+        ):
+            metric = f"{prefix}_{kind}_{field}_{unit}"
+            lines.append(f"# HELP {metric} {help_text} per {kind}")
+            lines.append(f"# TYPE {metric} summary")
+
+            for (metric_kind, name), stage_metrics in metrics:
+                if metric_kind != kind:
+                    continue
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                for q, value in stage_metrics.quantiles(field).items():
+                    lines.append(f'{metric}{{{kind}="{label}",quantile="{q}"}} {value}')
+                lines.append(f'{metric}_sum{{{kind}="{label}"}} {getattr(stage_metrics.totals, field)}')
+                lines.append(f'{metric}_count{{{kind}="{label}"}} {stage_metrics.count}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,292 @@
+import json
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from constants import ROOT
+from functions.vaccinations import VACCINATION_DATA
+
+DATA_DIR = ROOT / "apps" / "data"
+POPULATION_DATA = DATA_DIR / "population_data.pickle"
+POPULATION_TOTAL_DATA = DATA_DIR / "population_total.csv"
+LOCATION_CODES = DATA_DIR / "location_codes.json"
+
+# Columnar stores: an int64 `.npy` matrix (one column per year) and a `.json` sidecar with its labels
+UN_POPULATION = DATA_DIR / "population_un"
+TOTAL_POPULATION = DATA_DIR / "population_total"
+
+# Stands in for missing values in the integer stores
+MISSING = -1
+
+# Suffixes of the counts in the Gapminder table
+MULTIPLIERS = {"k": 1e3, "M": 1e6, "B": 1e9}
+
+# OWID location names that can not be matched to UN codes with `pycountry`, either because they are aggregates or because fuzzy search picks the wrong country (e.g. "Niger" -> Nigeria). A list of codes is summed; `None` marks locations the UN does not report separately.
+OVERRIDES = {
+    "World": 900,
+    "Africa": 903,
+    "Asia": 935,
+    "Europe": 908,
+    "North America": 905,
+    "South America": 931,
+    "Oceania": 909,
+    "High income": 1503,
+    "Upper middle income": 1502,
+    "Lower middle income": 1501,
+    "Low income": 1500,
+    "European Union": [40, 56, 100, 191, 196, 203, 208, 233, 246, 250, 276, 300, 348, 372, 380, 428, 440, 442, 470, 528, 616, 620, 642, 703, 705, 724, 752],
+    "Bonaire Sint Eustatius and Saba": 535,
+    "Burkina Faso": 854,
+    "Cape Verde": 132,
+    "Cook Islands": 184,
+    "Curacao": 531,
+    "Democratic Republic of Congo": 180,
+    "Faeroe Islands": 234,
+    "Falkland Islands": 238,
+    "Hong Kong": 344,
+    "Macao": 446,
+    "Niger": 562,
+    "Nigeria": 566,
+    "Sao Tome and Principe": 678,
+    "South Korea": 410,
+    "South Sudan": 728,
+    "Sudan": 729,
+    "Taiwan": 158,
+    "Tanzania": 834,
+    "Turkmenistan": 795,
+    "Uganda": 800,
+    "Vatican": 336,
+    "Turkey": 792,
+    "Wallis and Futuna": 876,
+    "England": None,
+    "Northern Ireland": None,
+    "Scotland": None,
+    "Wales": None,
+    "Kosovo": None,
+    # Only reported together, as the Channel Islands (830)
+    "Guernsey": None,
+    "Jersey": None,
+    # Counted within Cyprus (196)
+    "Northern Cyprus": None,
+    # Not in the 2019 revision of the UN data
+    "Pitcairn": None,
+}
+
+# Gapminder country names that differ from OWID location names
+GAPMINDER_NAMES = {
+    "Congo, Dem. Rep.": "Democratic Republic of Congo",
+    "Congo, Rep.": "Congo",
+    "Czech Republic": "Czechia",
+    "Holy See": "Vatican",
+    "Hong Kong, China": "Hong Kong",
+    "Kyrgyz Republic": "Kyrgyzstan",
+    "Lao": "Laos",
+    "Slovak Republic": "Slovakia",
+    "St. Kitts and Nevis": "Saint Kitts and Nevis",
+    "St. Lucia": "Saint Lucia",
+    "St. Vincent and the Grenadines": "Saint Vincent and the Grenadines",
+    "Timor-Leste": "Timor",
+}
+
+
+def read_population_data(source=POPULATION_DATA) -> pd.DataFrame:
+    '''Reads the UN WPP total population sheet (thousands of people) with the header rows removed, either from the pickled dump or, given an `.xlsx` path or URL, from the original workbook.
+    '''
+    if str(source).endswith(".xlsx"):
+        df = pd.read_excel(source)
+    else:
+        with open(source, "rb") as f:
+            df = pickle.load(f)
+
+    # Removes first 14 rows containing unrelated information
+    df = df.iloc[15:]
+
+    # Sets the first row as column names
+    df.columns = df.iloc[0]
+
+    # Removes the first row containing column names as it is no longer needed
+    df = df.iloc[1:]
+
+    return df
+
+
+def population_by_code(df: pd.DataFrame) -> pd.DataFrame:
+    '''Indexes the UN WPP sheet by numeric country code, one column of people per year.
+    '''
+    years = [column for column in df.columns if str(column).isdigit()]
+
+    # Missing estimates are reported as "..."
+    by_code = df.set_index(df[df.columns[4]].astype(int))[years].apply(pd.to_numeric, errors="coerce") * 1000
+    by_code.index.name = "code"
+    by_code.columns = [str(year) for year in years]
+
+    return by_code
+
+
+def parse_counts(values: np.ndarray) -> np.ndarray:
+    '''Parses a matrix of counts written as strings, such as "3.28M" or "740k", into an int64 matrix of the same shape, with `MISSING` for empty cells. The matrix is parsed as one flat column, so every step runs once over all cells.
+    '''
+    values = np.asarray(values)
+    text = pd.Series(values.ravel(), dtype=object)
+
+    suffix = text.str[-1]
+    suffixed = suffix.isin(list(MULTIPLIERS))
+    multiplier = suffix.map(MULTIPLIERS).fillna(1).to_numpy()
+    counts = pd.to_numeric(text.mask(suffixed, text.str[:-1])).to_numpy(dtype=float) * multiplier
+
+    return np.where(np.isnan(counts), MISSING, np.rint(counts)).astype(np.int64).reshape(values.shape)
+
+
+def read_population_total_data() -> pd.DataFrame:
+    '''Reads the Gapminder total population table into an int64 frame indexed by country, one column of people per year; see `parse_counts`.
+    '''
+    df = pd.read_csv(POPULATION_TOTAL_DATA, index_col="country", dtype=str, encoding="utf-8-sig")
+
+    return pd.DataFrame(parse_counts(df.to_numpy()), index=df.index, columns=df.columns)
+
+
+def write_columnar(path: Path, df: pd.DataFrame) -> None:
+    '''Writes `df` as an int64 matrix in column-major order, so that every column is one contiguous block of the file, with its labels in a JSON sidecar.
+    '''
+    values = df.to_numpy(dtype=float)
+    values = np.where(np.isnan(values), MISSING, np.rint(values)).astype(np.int64)
+
+    np.save(path.with_suffix(".npy"), np.asfortranarray(values))
+    with open(path.with_suffix(".json"), "w") as f:
+        json.dump({"index": df.index.tolist(), "columns": [str(column) for column in df.columns]}, f)
+
+    _read_labels.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _read_labels(path: Path) -> dict:
+    with open(path.with_suffix(".json")) as f:
+        return json.load(f)
+
+
+def read_column(path: Path, column: str) -> pd.Series:
+    '''Reads one `column` of a store written by `write_columnar`. The matrix is memory-mapped, so only the pages of that column are read from disk.
+    '''
+    labels = _read_labels(path)
+    values = np.load(path.with_suffix(".npy"), mmap_mode="r")[:, labels["columns"].index(str(column))]
+
+    return pd.Series(np.where(values == MISSING, np.nan, values), index=labels["index"], name=str(column))
+
+
+def read_table(path: Path) -> pd.DataFrame:
+    '''Reads a whole store written by `write_columnar`, with `NaN` for missing values.
+    '''
+    labels = _read_labels(path)
+    values = np.load(path.with_suffix(".npy"), mmap_mode="r")
+
+    return pd.DataFrame(
+        np.where(values == MISSING, np.nan, values), index=labels["index"], columns=labels["columns"]
+    )
+
+
+def get_population_table() -> pd.DataFrame:
+    '''Reads the Gapminder store indexed by OWID location name, one column of people per year from 1800 to 2100 (projected).
+    '''
+    return read_table(TOTAL_POPULATION).rename(index=GAPMINDER_NAMES)
+
+
+def daily_population(table: pd.DataFrame, locations: np.ndarray, dates: np.ndarray) -> np.ndarray:
+    '''Population of every (location, date) pair, interpolated linearly between the yearly values of `table` (indexed by location, one column per year), taken as mid-year estimates. Dates outside the years of `table` get its first or last value, locations missing from it `NaN`. All rows are computed in one gather from the matrix.
+    '''
+    # A trailing row of NaN, picked by the -1 of locations missing from `table`
+    matrix = np.vstack([table.to_numpy(dtype=float), np.full((1, len(table.columns)), np.nan)])
+    codes, uniques = pd.factorize(np.asarray(locations))
+    rows = table.index.get_indexer(uniques)[codes]
+
+    if len(table.columns) < 2:
+        return matrix[rows, 0]
+
+    dates = pd.DatetimeIndex(dates)
+    # Fractional years, with the middle of every day
+    t = (dates.year + (dates.dayofyear - 0.5) / np.where(dates.is_leap_year, 366, 365)).to_numpy()
+    points = table.columns.astype(float).to_numpy() + 0.5
+
+    i = np.clip(np.searchsorted(points, t, side="right") - 1, 0, len(points) - 2)
+    weight = np.clip((t - points[i]) / (points[i + 1] - points[i]), 0, 1)
+
+    return matrix[rows, i] + (matrix[rows, i + 1] - matrix[rows, i]) * weight
+
+
+def build_columnar(source=POPULATION_DATA) -> None:
+    '''Offline build step: converts the UN WPP sheet (see `read_population_data` for `source`) and the Gapminder CSV to columnar stores.
+    '''
+    write_columnar(UN_POPULATION, population_by_code(read_population_data(source)))
+    write_columnar(TOTAL_POPULATION, read_population_total_data())
+
+
+def read_location_codes() -> dict:
+    '''Reads the OWID location name -> UN code mapping produced by `build_location_codes`.
+    '''
+    with open(LOCATION_CODES) as f:
+        return json.load(f)
+
+
+def get_populations(population: pd.Series, location_codes: dict) -> pd.Series:
+    '''Maps every location in `location_codes` to its population, given `population` indexed by UN code (e.g. one year of `UN_POPULATION`). Locations with several codes get the sum of their populations.
+    '''
+    return pd.Series(
+        {
+            location: population.reindex(code if isinstance(code, list) else [code]).sum(min_count=1)
+            for location, code in location_codes.items()
+        },
+        dtype=float,
+    )
+
+
+def build_location_codes(locations: Iterable[str], codes: Iterable[int]) -> tuple:
+    '''Offline build step: matches OWID location names to UN `codes` using `OVERRIDES`, exact `pycountry` lookups and, as a last resort, fuzzy search. Returns the mapping and the list of unresolved locations.
+    '''
+    import pycountry
+
+    codes = set(codes)
+    location_codes = {}
+    unresolved = []
+
+    for location in sorted(set(locations)):
+        if location in OVERRIDES:
+            code = OVERRIDES[location]
+        else:
+            try:
+                country = pycountry.countries.get(name=location) or pycountry.countries.search_fuzzy(location)[0]
+                code = int(country.numeric)
+            except LookupError:
+                code = None
+
+        if isinstance(code, list) or code in codes:
+            location_codes[location] = code
+        else:
+            unresolved.append(location)
+
+    return location_codes, unresolved
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "columnar":
+        build_columnar()
+        print(f"Wrote {UN_POPULATION.name} and {TOTAL_POPULATION.name} stores")
+    elif command == "codes":
+        # Takes OWID location names from a local vaccinations CSV if given, else downloads the latest one
+        source = sys.argv[2] if len(sys.argv) > 2 else VACCINATION_DATA
+        locations = pd.read_csv(source, usecols=["location"])["location"].unique()
+
+        location_codes, unresolved = build_location_codes(locations, _read_labels(UN_POPULATION)["index"])
+
+        with open(LOCATION_CODES, "w") as f:
+            json.dump(location_codes, f, indent=4, sort_keys=True)
+
+        print(f"Resolved {len(location_codes)} locations, unresolved: {', '.join(unresolved) or 'none'}")
+    else:
+        print("Usage: python -m functions.population columnar | codes [vaccinations.csv]")
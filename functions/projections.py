@@ -0,0 +1,267 @@
+from dataclasses import dataclass
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from functions import forecasting, population, vaccinations
+from functions.population import daily_population
+from functions.vaccinations import location_rows
+
+# Vaccination goals, in percent of the population
+GOALS = (10, 30, 50, 70, 80, 100)
+
+
+class Projections(NamedTuple):
+    '''Result of `project`. `series` holds the daily time series of every location, indexed by location and sorted by (location, date); `rows` holds the range of rows of every location in it. `summary` holds one row per location with the latest observation, population and the projections of `goals` made with forecasting `model`, ready to be sliced into `location_info`.
+    '''
+    series: pd.DataFrame
+    summary: pd.DataFrame
+    goals: Tuple[int, ...]
+    rows: Dict[str, slice]
+    model: str
+
+
+def prepare(df_raw: pd.DataFrame, population: pd.Series, population_table: pd.DataFrame = None) -> Projections:
+    '''Computes cumulative sums and the share of fully vaccinated people for every location of the raw OWID table (`date`, `location`, `daily_vaccinations`) in one pass, without goal projections; see `project_goals`. `population` maps location names to their population; locations missing from it get `NaN` projections. If given, `population_table` (yearly populations by location, see `daily_population`) gives the share of every day against the population of that day, falling back to `population` where it has none.
+    '''
+    df = df_raw.sort_values(["location", "date"], kind="mergesort", ignore_index=True)
+    # The snapshot stores nullable int32 counts; sums need float64, which also turns missing days into NaN
+    df["daily_vaccinations"] = df["daily_vaccinations"].astype(float)
+
+    df["daily_vaccinations_cumsum"] = df.groupby("location", sort=False)["daily_vaccinations"].cumsum()
+
+    locations = df["location"].to_numpy()
+    population = population.astype(float)
+
+    denominator = population.reindex(locations).to_numpy()
+    if population_table is not None:
+        daily = daily_population(population_table, locations, df["date"].to_numpy())
+        denominator = np.where(np.isnan(daily), denominator, daily)
+
+    # Assumes two doses per person
+    df["percent_fully_vaccinated"] = df["daily_vaccinations_cumsum"].to_numpy() * 100 / (denominator * 2)
+    df["percent_fully_vaccinated"] = df["percent_fully_vaccinated"].fillna(0)
+
+    # ---------------------------------------------------------------------------------------------------------------------------
+
+    first = df[["location", "date"]].drop_duplicates("location", keep="first").set_index("location")
+    columns = ["location", "date", "daily_vaccinations", "daily_vaccinations_cumsum"]
+    # Latest day with a count: a missing last report would leave the cumulative sum, and so every goal, undefined;
+    # locations without any count keep their last row
+    summary = (
+        df.loc[df["daily_vaccinations"].notna(), columns]
+        .drop_duplicates("location", keep="last")
+        .set_index("location")
+        .combine_first(df[columns].drop_duplicates("location", keep="last").set_index("location"))
+    )
+
+    summary["population"] = population.reindex(summary.index)
+    summary["vacc_start_date"] = first["date"]
+    summary["vaccinated_people"] = summary["daily_vaccinations_cumsum"] / 2
+
+    return Projections(df.set_index("location"), summary, (), location_rows(df["location"]), forecasting.DEFAULT)
+
+
+def project_goals(
+    base: Projections, goals: Sequence[int] = GOALS, model: str = forecasting.DEFAULT
+) -> Projections:
+    '''Projects the dates of `goals` for every location of `base` (the result of `prepare`) with forecasting `model`, for all locations and goals at once. Only the summary is copied; the series is shared with `base`.
+    '''
+    series = base.series
+    summary = base.summary.copy()
+
+    rows = [base.rows[location] for location in summary.index]
+    values = series["daily_vaccinations"].to_numpy()
+    starts = np.array([r.start for r in rows], dtype=np.intp)
+    stops = np.array([r.stop for r in rows], dtype=np.intp)
+
+    # Forecasts start from the latest day with a count, like the summary; trailing missing days are left out
+    last_valid = np.maximum.reduceat(np.where(np.isfinite(values), np.arange(len(values)), -1), starts)
+    stops = np.where(last_valid >= starts, last_valid + 1, stops)
+
+    forecast = forecasting.forecast(model, series["date"].to_numpy(), values, starts, stops)
+
+    # Broadcasts (locations, 1) against (goals,)
+    _goals = np.asarray(goals, dtype=float)
+    _population = summary["population"].to_numpy(dtype=float)[:, None]
+    _vaccinated_people = summary["vaccinated_people"].to_numpy(dtype=float)[:, None]
+
+    goal_people = _population * _goals / 100
+    days_to_goal = np.trunc(forecasting.days_to_reach((goal_people - _vaccinated_people) * 2, forecast))
+
+    # Dates past the range of datetime64[ns] (about 290 years on) would wrap around; such goals count as never reached
+    dates = summary["date"].to_numpy(dtype="datetime64[ns]")
+    horizon = ((np.datetime64(pd.Timestamp.max) - dates) // np.timedelta64(1, "D")).astype(float)[:, None]
+    with np.errstate(invalid="ignore"):
+        days_to_goal[days_to_goal > horizon] = np.nan
+
+    goal_offsets = np.full(days_to_goal.shape, np.timedelta64("NaT"), dtype="timedelta64[D]")
+    finite = ~np.isnan(days_to_goal)
+    goal_offsets[finite] = days_to_goal[finite].astype("timedelta64[D]")
+    goal_dates = dates[:, None] + goal_offsets
+
+    for i, perc in enumerate(goals):
+        summary[f"goal_vaccinations_{perc}_perc"] = goal_people[:, i] * 2
+        summary[f"days_to_goal_{perc}_perc"] = days_to_goal[:, i]
+        summary[f"goal_date_{perc}_perc"] = goal_dates[:, i]
+
+    return base._replace(summary=summary, goals=tuple(goals), model=model)
+
+
+def project(
+    df_raw: pd.DataFrame, population: pd.Series, goals: Sequence[int] = GOALS, model: str = forecasting.DEFAULT
+) -> Projections:
+    '''`prepare` followed by `project_goals`.
+    '''
+    return project_goals(prepare(df_raw, population), goals, model)
+
+
+def prepare_from_store(year: str) -> Projections:
+    '''Runs `prepare` on the shared vaccinations snapshot and one `year` of the UN population store, for callers outside the app and its caches (reports, the API); callers that project several goals or models can keep the result and pass it to `project_goals`.
+    '''
+    populations = population.get_populations(
+        population.read_column(population.UN_POPULATION, year), population.read_location_codes()
+    )
+
+    return prepare(vaccinations.store.get(), populations)
+
+
+def from_store(year: str, goals: Sequence[int] = GOALS, model: str = forecasting.DEFAULT) -> Projections:
+    '''`prepare_from_store` followed by `project_goals`.
+    '''
+    return project_goals(prepare_from_store(year), goals, model)
+
+
+class Crossings(NamedTuple):
+    '''Result of `locate_crossings`, one element per threshold. Thresholds that are not reached within the series get index `-1`, date `NaT` and value `NaN`.
+    '''
+    index: np.ndarray
+    date: np.ndarray
+    value: np.ndarray
+
+
+def locate_crossings(dates: np.ndarray, values: np.ndarray, thresholds: Sequence[float]) -> Crossings:
+    '''Finds the first point at which the cumulative series `values` reaches each of the `thresholds`. Missing values count as no progress, so the series is made monotonic before a single `np.searchsorted` call locates all thresholds at once.
+    '''
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    values = np.maximum.accumulate(np.nan_to_num(np.asarray(values, dtype=float)))
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    index = np.searchsorted(values, thresholds, side="left")
+    crossed = index < len(values)
+    index = np.where(crossed, index, -1)
+
+    date = np.full(thresholds.shape, np.datetime64("NaT"), dtype="datetime64[ns]")
+    date[crossed] = dates[index[crossed]]
+    value = np.full(thresholds.shape, np.nan)
+    value[crossed] = values[index[crossed]]
+
+    return Crossings(index, date, value)
+
+
+class Goal(NamedTuple):
+    '''Projection for one vaccination goal of a location. The marker is where the goal is drawn: the date it was actually reached or, if it is not reached yet, the projected date.
+    '''
+    perc: int
+    vaccinations: float
+    days_to_goal: float
+    date: pd.Timestamp
+    marker_date: pd.Timestamp
+    marker_vaccinations: float
+
+
+@dataclass(frozen=True)
+class LocationData:
+    '''Time series and summary of one location. The arrays are read-only views into the cached `Projections.series`, so selecting a location copies no data.
+    '''
+    __slots__ = (
+        "location",
+        "date",
+        "daily_vaccinations",
+        "daily_vaccinations_cumsum",
+        "percent_fully_vaccinated",
+        "population",
+        "vacc_start_date",
+        "last_date",
+        "last_daily_vaccinations",
+        "vaccinated_people",
+        "goals",
+        "model",
+    )
+
+    location: str
+    date: np.ndarray
+    daily_vaccinations: np.ndarray
+    daily_vaccinations_cumsum: np.ndarray
+    percent_fully_vaccinated: np.ndarray
+    population: float
+    vacc_start_date: pd.Timestamp
+    last_date: pd.Timestamp
+    last_daily_vaccinations: float
+    vaccinated_people: float
+    goals: Tuple[Goal, ...]
+    model: str
+
+    def to_frame(self) -> pd.DataFrame:
+        '''Copies the time series into a new frame, e.g. for display or export.
+        '''
+        return pd.DataFrame(
+            {
+                "date": self.date,
+                "daily_vaccinations": self.daily_vaccinations,
+                "daily_vaccinations_cumsum": self.daily_vaccinations_cumsum,
+                "percent_fully_vaccinated": self.percent_fully_vaccinated,
+            }
+        )
+
+
+def select(projections: Projections, location: str) -> LocationData:
+    '''Selects `location` from `projections`. The rows of a location are one contiguous range of the sorted series, looked up in `Projections.rows`.
+    '''
+    series, summary, goals, location_rows, model = projections
+
+    rows = location_rows[location]
+
+    def column(name: str) -> np.ndarray:
+        values = series[name].to_numpy()[rows]
+        values.flags.writeable = False
+        return values
+
+    date = column("date")
+    daily_vaccinations_cumsum = column("daily_vaccinations_cumsum")
+    row = summary.loc[location]
+
+    goal_vaccinations = [row[f"goal_vaccinations_{perc}_perc"] for perc in goals]
+    crossings = locate_crossings(date, daily_vaccinations_cumsum, goal_vaccinations)
+
+    _goals = []
+    for i, perc in enumerate(goals):
+        goal_date = row[f"goal_date_{perc}_perc"]
+        crossed = not np.isnat(crossings.date[i])
+        _goals.append(
+            Goal(
+                perc,
+                goal_vaccinations[i],
+                row[f"days_to_goal_{perc}_perc"],
+                goal_date,
+                # Goals already reached are marked at their actual date, the rest at the projected date
+                pd.Timestamp(crossings.date[i]) if crossed else goal_date,
+                crossings.value[i] if crossed else goal_vaccinations[i],
+            )
+        )
+
+    return LocationData(
+        location,
+        date,
+        column("daily_vaccinations"),
+        daily_vaccinations_cumsum,
+        column("percent_fully_vaccinated"),
+        row["population"],
+        row["vacc_start_date"],
+        row["date"],
+        row["daily_vaccinations"],
+        row["vaccinated_people"],
+        tuple(_goals),
+        model,
+    )
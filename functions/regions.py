@@ -0,0 +1,73 @@
+from typing import Dict, Iterable, Tuple
+
+import pandas as pd
+
+
+def parse(text: str, locations: Iterable[str]) -> Dict[str, Tuple[str, ...]]:
+    '''Parses region definitions, one per line as `Name: Location, Location, ...`, and checks them against the known `locations`. Raises `ValueError` describing the first invalid line.
+    '''
+    locations = set(locations)
+
+    regions = {}
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+
+        name, separator, members = line.partition(":")
+        name = name.strip()
+        members = tuple(dict.fromkeys(member.strip() for member in members.split(",") if member.strip()))
+
+        if not separator or not name or not members:
+            raise ValueError(f"Line {number}: expected `Name: Location, Location, ...`")
+        if name in locations or name in regions:
+            raise ValueError(f"Line {number}: there is already a location or region named {name}")
+        unknown = [member for member in members if member not in locations]
+        if unknown:
+            raise ValueError(f"Line {number}: unknown location(s) {', '.join(unknown)}")
+
+        regions[name] = members
+
+    return regions
+
+
+def aggregate(df: pd.DataFrame, regions: Dict[str, Tuple[str, ...]]) -> pd.DataFrame:
+    '''Sums the daily vaccinations of the member locations of every region per date, for all regions in one groupby. A location may belong to several regions. Only the rows of member locations are read, so the cost grows with the regions rather than with `df`.
+    '''
+    members = pd.DataFrame(
+        [(member, name) for name, region_members in regions.items() for member in region_members],
+        columns=["location", "region"],
+    )
+    # `isin` on the categorical snapshot compares category codes, not strings
+    rows = df.loc[df["location"].isin(members["location"].unique()), ["date", "location", "daily_vaccinations"]]
+    rows = rows.astype({"location": str}).merge(members, on="location")
+    # Counts are summed in float64, as regions may exceed the int32 range of the snapshot over time
+    rows["daily_vaccinations"] = rows["daily_vaccinations"].astype(float)
+
+    return (
+        rows.groupby(["region", "date"])["daily_vaccinations"]
+        .sum(min_count=1)
+        .reset_index()
+        .rename(columns={"region": "location"})
+    )
+
+
+def populations(population: pd.Series, regions: Dict[str, Tuple[str, ...]]) -> pd.Series:
+    '''Population of every region: the sum of its members' populations, or `NaN` if any member has none.
+    '''
+    return pd.Series(
+        {name: population.reindex(list(members)).sum(min_count=len(members)) for name, members in regions.items()},
+        dtype=float,
+    )
+
+
+def population_table(table: pd.DataFrame, regions: Dict[str, Tuple[str, ...]]) -> pd.DataFrame:
+    '''Adds the yearly populations of `regions` to `table` (one column per year): the sums of their members' populations, `NaN` for years where any member has none. Regions replace rows of `table` of the same name, which may be countries that are not OWID locations.
+    '''
+    if not regions:
+        return table
+
+    sums = pd.DataFrame(
+        {name: table.reindex(list(members)).sum(min_count=len(members)) for name, members in regions.items()}
+    ).T
+
+    return pd.concat([table.drop(index=list(regions), errors="ignore"), sums])
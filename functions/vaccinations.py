@@ -0,0 +1,281 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; workers may then revalidate the feed concurrently
+    fcntl = None
+
+from constants import CACHE_DIR
+
+VACCINATION_DATA = "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/vaccinations/vaccinations.csv"
+
+# Seconds before the local snapshot is revalidated against the upstream feed
+TTL = int(os.environ.get("VACCINATION_DATA_TTL", 60 * 60))
+# Seconds to wait after a failed revalidation before trying the feed again, while the last good snapshot is served
+RETRY = int(os.environ.get("VACCINATION_DATA_RETRY", 5 * 60))
+
+COLUMNS = ["date", "location", "daily_vaccinations"]
+
+
+def read_vaccination_data(source) -> pd.DataFrame:
+    '''Parses the columns used by the app from an OWID vaccinations CSV (path, URL or file object).
+    '''
+    return pd.read_csv(source, usecols=COLUMNS, parse_dates=["date"])[COLUMNS]
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    '''Converts a vaccinations frame to the layout of the snapshot: categorical `location` (with sorted categories), nullable int32 `daily_vaccinations`, and rows sorted by (location, date), so that every location is one contiguous range of rows.
+    '''
+    return (
+        pd.DataFrame(
+            {
+                "date": df["date"].astype("datetime64[ns]"),
+                "location": df["location"].astype(str).astype("category"),
+                "daily_vaccinations": pd.to_numeric(df["daily_vaccinations"]).round().astype("Int32"),
+            }
+        )
+        .sort_values(["location", "date"], kind="mergesort")
+        .reset_index(drop=True)
+    )
+
+
+def location_rows(locations: pd.Series) -> Dict[str, slice]:
+    '''Row range of every location in a `location` column sorted by location, e.g. of a `compact` frame.
+    '''
+    # Categorical columns are factorized from their integer codes, without comparing strings
+    codes, names = pd.factorize(locations)
+    starts = np.flatnonzero(np.diff(codes, prepend=-1))
+    stops = np.append(starts[1:], len(codes))
+
+    return {names[code]: slice(start, stop) for code, start, stop in zip(codes[starts], starts, stops)}
+
+
+def write_snapshot(path: Path, df: pd.DataFrame) -> None:
+    '''Writes a `compact` frame to the directory `path`, one `.npy` file per array, with the location names in a JSON sidecar.
+    '''
+    path.mkdir(parents=True)
+
+    location = df["location"].array
+    daily_vaccinations = df["daily_vaccinations"].array
+
+    np.save(path / "date.npy", df["date"].to_numpy())
+    np.save(path / "location.npy", location.codes)
+    np.save(path / "daily_vaccinations.npy", daily_vaccinations._data)
+    np.save(path / "daily_vaccinations_mask.npy", daily_vaccinations._mask)
+    with open(path / "locations.json", "w") as f:
+        json.dump(location.categories.tolist(), f)
+
+
+def read_snapshot(path: Path) -> pd.DataFrame:
+    '''Maps a snapshot written by `write_snapshot`. The columns are backed by the memory-mapped, read-only files, so every process reading the same snapshot shares its pages.
+    '''
+
+    def load(name: str) -> np.ndarray:
+        return np.load(path / f"{name}.npy", mmap_mode="r")
+
+    with open(path / "locations.json") as f:
+        locations = json.load(f)
+
+    return pd.DataFrame(
+        {
+            "date": pd.Series(load("date"), copy=False),
+            "location": pd.Categorical.from_codes(load("location"), categories=locations),
+            "daily_vaccinations": pd.arrays.IntegerArray(load("daily_vaccinations"), load("daily_vaccinations_mask")),
+        },
+        copy=False,
+    )
+
+
+def append_new_dates(df: pd.DataFrame, df_new: pd.DataFrame) -> pd.DataFrame:
+    '''Returns the rows of `df_new` that are newer than the last date of their location in `df`.
+    '''
+    last_dates = df.groupby("location")["date"].max()
+    cutoff = df_new["location"].map(last_dates)
+
+    return df_new[cutoff.isna() | (df_new["date"] > cutoff)]
+
+
+class VaccinationStore:
+    '''Local snapshot of the OWID vaccinations feed. The snapshot is kept on disk with the `ETag` and `Last-Modified` headers of the last download and revalidated with a conditional GET once it is older than `ttl` seconds. When the feed has changed, only rows with new dates are added to the snapshot. If the feed can not be reached or its response can not be read, the last good snapshot is served and the feed is tried again after `retry` seconds.
+
+    The snapshot is parsed once per host: it is published as a memory-mapped `write_snapshot` directory that every worker process maps zero-copy. Revalidation is serialized between processes with a file lock, so a worker that finds a snapshot refreshed by another one maps it instead of downloading the feed again. A new snapshot is written to a new directory and swapped in by atomically replacing the metadata file that names it.
+    '''
+
+    def __init__(
+        self, url: str = VACCINATION_DATA, path: Path = CACHE_DIR / "vaccinations", ttl: int = TTL, retry: int = RETRY
+    ):
+        self.url = url
+        self.path = Path(path)
+        self.ttl = ttl
+        self.retry = retry
+
+        self._lock = threading.Lock()
+        self._df = None
+        self._meta = {}
+        self._locations: Tuple[str, ...] = ()
+        self._rows: Dict[str, slice] = {}
+
+    @property
+    def version(self) -> str:
+        '''Identifies the upstream state of the snapshot; changes whenever new data is appended.
+        '''
+        return self._meta.get("version", "")
+
+    @property
+    def locations(self) -> Tuple[str, ...]:
+        '''Sorted names of the locations in the snapshot, computed once per snapshot.
+        '''
+        return self._locations
+
+    def rows(self, location: str) -> slice:
+        '''Range of the rows of `location` in the snapshot.
+        '''
+        return self._rows[location]
+
+    def get(self) -> pd.DataFrame:
+        '''Returns the snapshot, revalidating it first if it is stale. Only the first call waits for the feed: while one thread revalidates a snapshot, the others are served the current one. The frame is shared; treat it as read-only.
+        '''
+        if self._df is None:
+            with self._lock:
+                if self._df is None:
+                    self._refresh()
+        elif self._is_stale() and self._lock.acquire(blocking=False):
+            try:
+                self._refresh()
+            finally:
+                self._lock.release()
+
+        return self._df
+
+    def _refresh(self) -> None:
+        if self._df is None:
+            self._load()
+
+        if self._is_stale():
+            with self._file_lock():
+                # Another worker may have refreshed the snapshot in the meantime
+                self._load()
+
+                if self._is_stale():
+                    try:
+                        self._revalidate()
+                    except Exception:
+                        # Any failure, from an unreachable feed to a truncated or garbled body, keeps the last good snapshot
+                        if self._df is None:
+                            raise
+                        # Shared with the other workers, so that none of them blocks on the feed until `retry` has passed
+                        self._meta["failed"] = time.time()
+                        self._write_meta(self._meta)
+
+    def _is_stale(self) -> bool:
+        now = time.time()
+        return self._df is None or (
+            now - self._meta.get("checked", 0) >= self.ttl and now - self._meta.get("failed", 0) >= self.retry
+        )
+
+    @contextmanager
+    def _file_lock(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "w") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            # Released when the file is closed
+            yield
+
+    def _load(self) -> None:
+        try:
+            with open(self.path.with_suffix(".json")) as f:
+                meta = json.load(f)
+            if self._df is None or meta.get("snapshot") != self._meta.get("snapshot"):
+                self._set(read_snapshot(self.path.parent / meta["snapshot"]))
+        except (FileNotFoundError, KeyError, ValueError):
+            return
+
+        self._meta = meta
+
+    def _revalidate(self) -> None:
+        request = urllib.request.Request(self.url, headers={"Accept-Encoding": "gzip"})
+        if self._df is not None:
+            if "etag" in self._meta:
+                request.add_header("If-None-Match", self._meta["etag"])
+            if "last_modified" in self._meta:
+                request.add_header("If-Modified-Since", self._meta["last_modified"])
+
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                body = gzip.GzipFile(fileobj=response) if response.headers.get("Content-Encoding") == "gzip" else response
+                df_new = read_vaccination_data(body)
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                raise
+            # Not modified
+            self._meta["checked"] = time.time()
+            self._write_meta(self._meta)
+            return
+
+        snapshot = self._meta.get("snapshot")
+        if self._df is None:
+            df = compact(df_new)
+        else:
+            new_rows = append_new_dates(self._df, df_new)
+            df = compact(pd.concat([self._df, new_rows], ignore_index=True)) if not new_rows.empty else None
+
+        checked = time.time()
+        if df is not None:
+            snapshot = f"{self.path.name}-{checked:.6f}"
+            write_snapshot(self.path.parent / snapshot, df)
+
+        meta = {
+            key: value
+            for key, value in (("etag", headers.get("ETag")), ("last_modified", headers.get("Last-Modified")))
+            if value is not None
+        }
+        meta["checked"] = checked
+        meta["version"] = meta.get("etag") or meta.get("last_modified") or str(checked)
+        meta["snapshot"] = snapshot
+        self._write_meta(meta)
+
+        if df is not None:
+            # Drops the private copy for the shared, mapped one
+            self._set(read_snapshot(self.path.parent / snapshot))
+        # Swapped in after the frame, so that a reader never sees the new `version` with the old frame
+        self._meta = meta
+        if df is not None:
+            self._remove_old_snapshots()
+
+    def _set(self, df: pd.DataFrame) -> None:
+        # Readers are not locked out during a refresh: the lookups are built before the frame is swapped in
+        locations, rows = tuple(df["location"].cat.categories), location_rows(df["location"])
+        self._df, self._locations, self._rows = df, locations, rows
+
+    def _remove_old_snapshots(self) -> None:
+        # Processes still mapping an old snapshot keep reading it until they unmap it
+        for path in self.path.parent.glob(f"{self.path.name}-*"):
+            if path.is_dir() and path.name != self._meta["snapshot"]:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _write_meta(self, meta: dict) -> None:
+        # Written last and swapped in atomically, so a partial download is never taken for a valid snapshot
+        tmp = self.path.with_suffix(".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.path.with_suffix(".json"))
+
+
+# Shared by every session of the server process
+store = VaccinationStore(os.environ.get("VACCINATION_DATA_URL", VACCINATION_DATA))
@@ -0,0 +1,31 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_started = False
+
+
+def start(*tasks, max_workers: int = 4) -> None:
+    '''Runs each of `tasks` once per server process on a background thread pool. A task is called with the pool, so it can fan out further work (e.g. one chart per location). Streamlit reruns the main script on every interaction, so calls after the first one are no-ops.
+    '''
+    global _started
+
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup")
+    for task in tasks:
+        executor.submit(_run, task, executor)
+
+
+def _run(task, executor: ThreadPoolExecutor) -> None:
+    try:
+        task(executor)
+    except Exception:
+        # Warm-up is best effort; the page computes whatever is missing on demand
+        logger.exception("Warm-up task %s failed", getattr(task, "__qualname__", task))
@@ -0,0 +1,176 @@
+"""
+Renders the chart of every location of the vaccination goals app to standalone HTML and Plotly JSON, with an index page, on a process pool and without Streamlit; locations whose input is unchanged since the last run are skipped
+
+    python -m reports.vaccination_goals [--out report] [--goals 10 30 50 70 80 100] [--model last] [--workers 4] [--force]
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from functions import charts, forecasting, projections, vaccinations
+
+MANIFEST = "manifest.json"
+
+YEAR = "2020"
+
+# Set in every worker process by `_init_worker`
+_projections = None
+
+
+def slug(location: str) -> str:
+    return re.sub(r"[^\w]+", "-", location).strip("-").lower()
+
+
+def input_hash(projections_: projections.Projections, location: str, year: str) -> str:
+    """
+    Hashes everything the chart of `location` is made from: its daily series, population, goals, model and the app version
+    """
+    series = projections_.series.iloc[projections_.rows[location]]
+
+    digest = hashlib.sha256()
+    digest.update(series["date"].to_numpy().tobytes())
+    digest.update(series["daily_vaccinations"].to_numpy(dtype=float).tobytes())
+    digest.update(
+        json.dumps(
+            [
+                float(projections_.summary.at[location, "population"]),
+                year,
+                projections_.goals,
+                projections_.model,
+                charts.VERSION,
+            ]
+        ).encode()
+    )
+
+    return digest.hexdigest()
+
+
+def _init_worker(year: str, goals: tuple, model: str) -> None:
+    global _projections
+    # Workers map the snapshot the parent process has just refreshed, so they parse nothing
+    _projections = projections.from_store(year, goals, model)
+
+
+def render(location: str, year: str, out: Path) -> tuple:
+    """
+    Writes the chart of `location` as HTML and JSON; runs in the worker processes. Returns the location and the seconds it took
+    """
+    start = time.perf_counter()
+
+    data = projections.select(_projections, location)
+    fig = charts.make_plot(data, year)
+
+    name = slug(location)
+    # The HTML pages share one copy of plotly.js in `out`
+    fig.write_html(out / f"{name}.html", include_plotlyjs="directory", full_html=True)
+    (out / f"{name}.json").write_text(fig.to_json())
+
+    return location, time.perf_counter() - start
+
+
+def write_index(out: Path, projections_: projections.Projections, manifest: dict) -> None:
+    rows = []
+    for location in sorted(manifest):
+        summary = projections_.summary.loc[location]
+        rows.append(
+            "<tr><td><a href='{name}.html'>{location}</a></td><td>{date:%Y-%m-%d}</td><td>{share:.1f}%</td><td><a href='{name}.json'>JSON</a></td></tr>".format(
+                name=slug(location),
+                location=html.escape(location),
+                date=summary["date"],
+                share=summary["vaccinated_people"] * 100 / summary["population"],
+            )
+        )
+
+    (out / "index.html").write_text(
+        f"""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Vaccination Goal Visualizer</title></head>
+<body>
+<h1>Vaccination Goal Visualizer</h1>
+<p>Data snapshot: {html.escape(vaccinations.store.version)}. Generated {time.strftime("%Y-%m-%d %H:%M:%S %Z")}.</p>
+<table>
+<tr><th>Location</th><th>Last report</th><th>Fully vaccinated</th><th></th></tr>
+{os.linesep.join(rows)}
+</table>
+</body>
+</html>
+"""
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", type=Path, default=Path("report"))
+    parser.add_argument("--year", default=YEAR)
+    parser.add_argument("--goals", type=int, nargs="+", default=list(projections.GOALS))
+    parser.add_argument("--model", choices=list(forecasting.MODELS), default=forecasting.DEFAULT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true", help="render every location, changed or not")
+    args = parser.parse_args()
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    goals = tuple(sorted(args.goals))
+
+    start = time.perf_counter()
+    # Refreshes the shared snapshot once, before the workers start
+    projections_ = projections.from_store(args.year, goals, args.model)
+
+    manifest_path = args.out / MANIFEST
+    previous = json.loads(manifest_path.read_text()) if manifest_path.exists() and not args.force else {}
+
+    manifest, pending, skipped = {}, [], []
+    for location in projections_.summary.index:
+        if np.isnan(projections_.summary.at[location, "population"]):
+            # No chart without a population
+            skipped.append(location)
+            continue
+
+        digest = input_hash(projections_, location, args.year)
+        manifest[location] = {"hash": digest, "seconds": previous.get(location, {}).get("seconds")}
+        if previous.get(location, {}).get("hash") != digest or not (args.out / f"{slug(location)}.html").exists():
+            pending.append(location)
+
+    print(f"{len(pending)} to render, {len(manifest) - len(pending)} unchanged, {len(skipped)} without population")
+
+    failed = {}
+    if pending:
+        with ProcessPoolExecutor(
+            args.workers, initializer=_init_worker, initargs=(args.year, goals, args.model)
+        ) as executor:
+            futures = {executor.submit(render, location, args.year, args.out): location for location in pending}
+            for future in as_completed(futures):
+                try:
+                    location, seconds = future.result()
+                except Exception as e:
+                    # One broken location does not cost the rest of the run; it is left out of the manifest and retried next time
+                    location = futures[future]
+                    failed[location] = f"{type(e).__name__}: {e}"
+                    del manifest[location]
+                    print(f"{location:<40}{'failed':>10}  {failed[location]}")
+                    continue
+
+                manifest[location]["seconds"] = seconds
+                print(f"{location:<40}{seconds * 1000:>10.1f} ms")
+
+    write_index(args.out, projections_, manifest)
+    # Written last, so that an interrupted run renders the same locations again
+    manifest_path.write_text(json.dumps(manifest, indent=4, sort_keys=True))
+
+    print(f"Done in {time.perf_counter() - start:.1f} s, index at {args.out / 'index.html'}")
+
+    if failed:
+        print(f"{len(failed)} location(s) failed: {', '.join(sorted(failed))}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import json
+
+import pytest
+
+from api import vaccination_goals as api
+
+
+@pytest.mark.parametrize("goals", ["0", "101", "9" * 400, ",".join(str(goal) for goal in range(1, api.MAX_GOALS + 2))])
+def test_out_of_range_goals_are_rejected(goals):
+    status, _, body = api.response("version", "/projections", (("goals", goals),))
+
+    assert status == 400
+    assert "goals" in json.loads(body)["error"]
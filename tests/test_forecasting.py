@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import forecasting, projections
+
+DAYS = 60
+
+
+@pytest.fixture
+def series():
+    '''Two locations of daily counts with gaps, one of them ending in missing days.
+    '''
+    rng = np.random.default_rng(0)
+    values = {}
+    for location, trend in (("A", 50.0), ("B", -20.0)):
+        daily = 10_000 + trend * np.arange(DAYS) + rng.normal(0, 500, DAYS)
+        daily[rng.random(DAYS) < 0.1] = np.nan
+        values[location] = daily
+    values["B"][-3:] = np.nan
+
+    return values
+
+
+def run(model: str, values: dict) -> forecasting.Forecast:
+    daily = np.concatenate(list(values.values()))
+    date = np.tile(pd.date_range("2021-01-01", periods=DAYS).to_numpy(), len(values))
+    starts = np.arange(len(values)) * DAYS
+
+    return forecasting.forecast(model, date, daily, starts, starts + DAYS)
+
+
+def test_rolling_mean_matches_pandas(series):
+    expected = [pd.Series(v).rolling(forecasting.WINDOW, min_periods=1).mean().iloc[-1] for v in series.values()]
+    # Location B has no counts in its last 3 days, which pandas skips like the model does
+    np.testing.assert_allclose(run("rolling_mean", series).rate, expected)
+
+
+def test_exponential_matches_pandas(series):
+    expected = [pd.Series(v).ewm(alpha=forecasting.ALPHA, adjust=True).mean().iloc[-1] for v in series.values()]
+    np.testing.assert_allclose(run("exponential", series).rate, expected)
+
+
+def test_trend_matches_polyfit(series):
+    forecast = run("trend", series)
+
+    for i, v in enumerate(series.values()):
+        t = np.arange(-DAYS + 1, 1)[-forecasting.TREND_WINDOW :]
+        y = v[-forecasting.TREND_WINDOW :]
+        finite = np.isfinite(y)
+        slope, intercept = np.polyfit(t[finite], y[finite], 1)
+        assert forecast.slope[i] == pytest.approx(slope)
+        assert forecast.rate[i] == pytest.approx(intercept)
+
+
+def test_last_matches_last_value(series):
+    np.testing.assert_allclose(run("last", series).rate[0], series["A"][-1])
+
+
+def test_missing_last_report_keeps_goals(series):
+    df = pd.concat(
+        [
+            pd.DataFrame(
+                {"date": pd.date_range("2021-01-01", periods=DAYS), "location": location, "daily_vaccinations": v}
+            )
+            for location, v in series.items()
+        ],
+        ignore_index=True,
+    )
+    population = pd.Series({"A": 1e7, "B": 1e7})
+
+    for model in forecasting.MODELS:
+        summary = projections.project(df, population, goals=(100,), model=model).summary
+        # B's summary is its last day with a count
+        assert summary.at["B", "date"] == pd.Timestamp("2021-01-01") + pd.Timedelta(days=DAYS - 4)
+        assert summary.at["B", "vaccinated_people"] == np.nansum(series["B"]) / 2
+        assert summary["days_to_goal_100_perc"].notna().all(), model
+
+
+def test_falling_trend_below_zero_never_reaches_goal():
+    daily = np.concatenate([np.full(40, 20_000.0), np.linspace(20_000, 200, 14), np.full(14, 200.0)])
+    df = pd.DataFrame(
+        {"date": pd.date_range("2021-01-01", periods=len(daily)), "location": "A", "daily_vaccinations": daily}
+    )
+    # 5000 doses short of 100%
+    population = pd.Series({"A": (daily.sum() + 5000) / 2})
+
+    summary = projections.project(df, population, goals=(100,), model="trend").summary
+
+    assert np.isnan(summary.at["A", "days_to_goal_100_perc"])
+    assert pd.isnull(summary.at["A", "goal_date_100_perc"])
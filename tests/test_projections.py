@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from functions import projections
+
+
+def make_vaccinations(daily: dict, start: str = "2021-01-01") -> pd.DataFrame:
+    return pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "date": pd.date_range(start, periods=len(values)),
+                    "location": location,
+                    "daily_vaccinations": values,
+                }
+            )
+            for location, values in daily.items()
+        ],
+        ignore_index=True,
+    )
+
+
+def test_goals_beyond_datetime_range_are_not_reached():
+    # 1 dose a day against a billion people is far more days than datetime64[ns] spans
+    df = make_vaccinations({"Slow": [1.0] * 10, "Fast": [1e6] * 10})
+    population = pd.Series({"Slow": 1e9, "Fast": 1e7})
+
+    summary = projections.project(df, population, goals=(50,)).summary
+
+    assert np.isnan(summary.at["Slow", "days_to_goal_50_perc"])
+    assert pd.isnull(summary.at["Slow", "goal_date_50_perc"])
+    # (5e6 * 2 - 1e7) / 1e6 days after the last observation
+    assert summary.at["Fast", "days_to_goal_50_perc"] == 0
+    assert summary.at["Fast", "goal_date_50_perc"] == pd.Timestamp("2021-01-10")
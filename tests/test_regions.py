@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+
+from functions import population, regions
+
+
+def test_region_named_after_a_table_row_replaces_it():
+    table = pd.DataFrame({"2020": [10.0, 20.0, 5.0], "2021": [11.0, 21.0, 6.0]}, index=["A", "B", "North Korea"])
+
+    combined = regions.population_table(table, {"North Korea": ("A", "B")})
+
+    assert combined.index.is_unique
+    assert combined.loc["North Korea"].tolist() == [30.0, 32.0]
+
+    dates = np.array(["2021-07-02"], dtype="datetime64[ns]")
+    assert population.daily_population(combined, np.array(["North Korea"]), dates)[0] == 32.0
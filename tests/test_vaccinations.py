@@ -0,0 +1,127 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from functions.vaccinations import VaccinationStore
+
+CSV = "location,date,daily_vaccinations\nA,2021-01-01,10\nA,2021-01-02,20\nB,2021-01-01,5\n"
+CSV_NEW = CSV + "A,2021-01-03,30\nB,2021-01-02,\n"
+
+
+class Feed:
+    '''Local stand-in for the OWID feed; serves `body` with `etag`, or `status` if it is set. Requests wait for `gate` while it is set.
+    '''
+
+    def __init__(self):
+        self.body = CSV
+        self.etag = '"1"'
+        self.status = None
+        self.requests = 0
+        self.gate = None
+
+
+@pytest.fixture
+def feed():
+    state = Feed()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state.requests += 1
+            if state.gate is not None:
+                state.gate.wait(10)
+            if state.status is not None:
+                self.send_response(state.status)
+                self.end_headers()
+            elif self.headers.get("If-None-Match") == state.etag:
+                self.send_response(304)
+                self.end_headers()
+            else:
+                body = state.body.encode()
+                self.send_response(200)
+                self.send_header("ETag", state.etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state.url = f"http://127.0.0.1:{server.server_port}/vaccinations.csv"
+    yield state
+    server.shutdown()
+
+
+def make_store(feed, tmp_path, **kwargs) -> VaccinationStore:
+    return VaccinationStore(feed.url, tmp_path / "vaccinations", **kwargs)
+
+
+def test_not_modified_keeps_the_snapshot(feed, tmp_path):
+    store = make_store(feed, tmp_path, ttl=0)
+    df = store.get()
+    version = store.version
+
+    assert store.get() is df
+    assert store.version == version
+    assert feed.requests == 2
+
+
+def test_new_dates_are_appended(feed, tmp_path):
+    store = make_store(feed, tmp_path, ttl=0)
+    store.get()
+
+    feed.body, feed.etag = CSV_NEW, '"2"'
+    df = store.get()
+
+    assert store.version == '"2"'
+    assert len(df) == 5
+    assert df["date"].iloc[store.rows("A")].max() == pd.Timestamp("2021-01-03")
+    # Only the last snapshot is kept on disk
+    assert len(list(tmp_path.glob("vaccinations-*"))) == 1
+
+
+@pytest.mark.parametrize("status, body", [(500, None), (None, "garbage\n\x00\x01")])
+def test_failures_serve_the_last_snapshot_and_back_off(feed, tmp_path, status, body):
+    store = make_store(feed, tmp_path, ttl=0, retry=3600)
+    df = store.get()
+
+    feed.status, feed.etag = status, '"2"'
+    if body is not None:
+        feed.body = body
+    assert store.get() is df
+    requests = feed.requests
+
+    # Within `retry` the feed is not asked again, by this store or another one sharing the snapshot
+    assert store.get() is df
+    assert make_store(feed, tmp_path, ttl=0, retry=3600).get().equals(df)
+    assert feed.requests == requests
+
+
+def test_failure_without_snapshot_raises(feed, tmp_path):
+    feed.status = 500
+
+    with pytest.raises(Exception):
+        make_store(feed, tmp_path).get()
+
+
+def test_revalidation_does_not_block_other_threads(feed, tmp_path):
+    store = make_store(feed, tmp_path, ttl=0)
+    df = store.get()
+
+    feed.gate = threading.Event()
+    refresh = threading.Thread(target=store.get)
+    refresh.start()
+    while feed.requests < 2:
+        time.sleep(0.01)
+
+    try:
+        start = time.time()
+        assert store.get() is df
+        assert time.time() - start < 1
+    finally:
+        feed.gate.set()
+        refresh.join()